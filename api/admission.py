@@ -0,0 +1,223 @@
+# api/admission.py
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)  # dispatch order
+
+DEFAULT_DEADLINE_MS = {INTERACTIVE: 2_000, BULK: 30_000}
+MAX_DEADLINE_MS = 300_000
+DEFAULT_MAX_QUEUE = {INTERACTIVE: 64, BULK: 256}
+
+
+class Rejected(Exception):
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Priority admission in front of inference.
+
+    At most `concurrency` requests run at once. The rest wait in a
+    bounded queue per class, earliest deadline first; interactive
+    always dispatches before bulk. A request is rejected up front when
+    its queue is full (429) or when the predicted wait plus service
+    time would miss its deadline (503), both with Retry-After.
+
+    Runs entirely on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, concurrency=4, max_queue=None, default_deadline_ms=None,
+                 bulk_api_keys=()):
+        self.concurrency = concurrency
+        self.max_queue = dict(max_queue or DEFAULT_MAX_QUEUE)
+        self.default_deadline_ms = dict(default_deadline_ms or DEFAULT_DEADLINE_MS)
+        self.bulk_api_keys = set(bulk_api_keys)
+
+        self._busy = 0
+        self._running = {p: 0 for p in PRIORITIES}
+        self._queues = {p: [] for p in PRIORITIES}
+        self._seq = itertools.count()
+
+        # Moving average of service time per class, seeded pessimistically.
+        # Kept apart so long bulk/streaming requests don't inflate the
+        # wait predicted for interactive ones.
+        self.service_s = {p: 0.1 for p in PRIORITIES}
+        self._alpha = 0.1
+
+        self.counters = {
+            p: {"admitted": 0, "completed": 0, "rejected_queue_full": 0,
+                "rejected_deadline": 0, "expired_in_queue": 0}
+            for p in PRIORITIES
+        }
+
+    # -------- classification --------
+    def classify(self, headers):
+        """
+        (priority, absolute deadline) from request headers. A known bulk
+        API key always wins over a self-declared X-Priority.
+        """
+        api_key = headers.get("x-api-key")
+        if api_key and api_key in self.bulk_api_keys:
+            priority = BULK
+        else:
+            priority = headers.get("x-priority", INTERACTIVE).lower()
+            if priority not in PRIORITIES:
+                priority = INTERACTIVE
+
+        # nan, inf, zero and negatives fall back to the class default;
+        # very long deadlines are capped so they can't pin a queue slot
+        try:
+            deadline_ms = float(headers["x-deadline-ms"])
+        except (KeyError, ValueError):
+            deadline_ms = None
+        if deadline_ms is None or not math.isfinite(deadline_ms) or deadline_ms <= 0:
+            deadline_ms = self.default_deadline_ms[priority]
+        deadline_ms = min(deadline_ms, MAX_DEADLINE_MS)
+
+        return priority, time.monotonic() + deadline_ms / 1000
+
+    # -------- wait prediction --------
+    def _ahead_of(self, priority):
+        # Everything at the same or higher priority is served first
+        return PRIORITIES[:PRIORITIES.index(priority) + 1]
+
+    def predicted_wait(self, priority):
+        ahead = self._ahead_of(priority)
+        if self._busy < self.concurrency and not any(self._queues[p] for p in ahead):
+            return 0.0
+
+        # Queued work ahead of us, each at its own class's service time,
+        # plus one average running request for the first slot to free up,
+        # spread over all slots
+        work = sum(len(self._queues[p]) * self.service_s[p] for p in ahead)
+        if self._busy:
+            work += sum(self._running[p] * self.service_s[p] for p in PRIORITIES) / self._busy
+        return work / self.concurrency
+
+    # -------- admit / release --------
+    async def acquire(self, priority, deadline):
+        counters = self.counters[priority]
+        now = time.monotonic()
+        wait = self.predicted_wait(priority)
+
+        if wait == 0.0:
+            self._busy += 1
+            self._running[priority] += 1
+            counters["admitted"] += 1
+            return now
+
+        if len(self._queues[priority]) >= self.max_queue[priority]:
+            counters["rejected_queue_full"] += 1
+            raise Rejected(429, f"{priority} queue full", wait)
+
+        if now + wait + self.service_s[priority] > deadline:
+            counters["rejected_deadline"] += 1
+            raise Rejected(503, "Predicted wait exceeds request deadline", wait)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [deadline, next(self._seq), future]
+        heapq.heappush(self._queues[priority], entry)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, deadline - now))
+        except asyncio.TimeoutError:
+            self._abandon(priority, entry)
+            counters["expired_in_queue"] += 1
+            raise Rejected(503, "Deadline expired while queued", self.predicted_wait(priority))
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # The request itself was cancelled (client went away)
+                self._abandon(priority, entry)
+                raise
+            # _dispatch found the entry past its deadline
+            counters["expired_in_queue"] += 1
+            raise Rejected(503, "Deadline expired while queued", self.predicted_wait(priority))
+
+        counters["admitted"] += 1
+        return time.monotonic()
+
+    def _abandon(self, priority, entry):
+        future = entry[2]
+        if future.done() and not future.cancelled():
+            # Dispatched right as we gave up: hand the slot back
+            self.release(time.monotonic(), priority, record=False)
+        else:
+            self._remove(priority, entry)
+
+    def _remove(self, priority, entry):
+        queue = self._queues[priority]
+        try:
+            queue.remove(entry)
+            heapq.heapify(queue)
+        except ValueError:
+            pass
+        entry[2].cancel()
+
+    def release(self, started, priority, record=True):
+        self._busy -= 1
+        self._running[priority] -= 1
+        if record:
+            elapsed = time.monotonic() - started
+            self.service_s[priority] += self._alpha * (elapsed - self.service_s[priority])
+            self.counters[priority]["completed"] += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._busy < self.concurrency:
+                deadline, _, future = heapq.heappop(queue)
+                if future.done():
+                    continue
+                if deadline <= now:
+                    future.cancel()
+                    continue
+                self._busy += 1
+                self._running[priority] += 1
+                future.set_result(None)
+
+    # -------- stats --------
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "busy": self._busy,
+            "classes": {
+                p: {
+                    "running": self._running[p],
+                    "service_ms_avg": round(self.service_s[p] * 1000, 2),
+                    "queue_depth": len(self._queues[p]),
+                    "max_queue": self.max_queue[p],
+                    "predicted_wait_ms": round(self.predicted_wait(p) * 1000, 2),
+                    **self.counters[p]
+                }
+                for p in PRIORITIES
+            }
+        }
+
+
+def from_env():
+    bulk_keys = [k.strip() for k in os.getenv("BULK_API_KEYS", "").split(",") if k.strip()]
+    return AdmissionController(
+        concurrency=int(os.getenv("ADMISSION_CONCURRENCY", "4")),
+        max_queue={
+            INTERACTIVE: int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "64")),
+            BULK: int(os.getenv("ADMISSION_BULK_QUEUE", "256"))
+        },
+        default_deadline_ms={
+            INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_DEADLINE_MS", "2000")),
+            BULK: float(os.getenv("ADMISSION_BULK_DEADLINE_MS", "30000"))
+        },
+        bulk_api_keys=bulk_keys
+    )
@@ -0,0 +1,107 @@
+# api/coalesce.py
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+
+
+def normalize_text(text):
+    # Whitespace-only normalization: anything stronger could change the
+    # tokens a cased model sees
+    return " ".join(text.split())
+
+
+def _raiser(error):
+    def fn():
+        raise error
+    return fn
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight computation.
+
+    The first caller (leader) runs fn; callers arriving before it finishes
+    wait on the same concurrent.futures.Future. Sync and async handlers
+    share one table, so a sync request can join an async one and back.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = set()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, fn):
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if leader:
+            self._finish(key, future, fn)
+        return future.result()
+
+    async def do_async(self, key, fn, admit=None):
+        """
+        admit: optional coroutine function the leader awaits before running
+        fn, returning a release callable. Followers join first and never
+        call it, so a burst of identical requests takes one admission slot.
+        If admit raises, every caller of this key gets the same error.
+        """
+        future, leader = self._join(key)
+        if leader:
+            # Own task, so the leader's client going away doesn't cancel
+            # the work its followers are waiting on
+            task = asyncio.ensure_future(self._lead(key, future, fn, admit))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # Shielded: cancelling one waiter must not cancel the shared future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _lead(self, key, future, fn, admit):
+        release = None
+        try:
+            if admit is not None:
+                release = await admit()
+            # fn is blocking model work: keep it off the event loop.
+            # run_in_executor drops contextvars, so carry them explicitly.
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            await loop.run_in_executor(None, ctx.run, self._finish, key, future, fn)
+        except BaseException as e:
+            if not future.done():
+                self._finish(key, future, _raiser(e))
+        finally:
+            if release is not None:
+                release()
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                "requests": total,
+                "inferences": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+                "in_flight": len(self._calls)
+            }
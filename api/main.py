@@ -1,28 +1,304 @@
 # api/main.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import requests
+import hmac
 import os
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
 
-from model.sentiment_model import predict_sentiment
+from model.registry import registry
+from model.scheduler import ReplicaPool
+from api.streaming import negotiate, iter_scored, stream_response
+from api.coalesce import SingleFlight, normalize_text
+from model.similarity_index import VersionedIndex
+from api import admission, profiling
 
 # ---------------------------------
 # App initialization
 # ---------------------------------
 app = FastAPI(title="FinBERT Sentiment API")
 
+# ---------------------------------
+# Admission control
+# ---------------------------------
+# Interactive vs bulk priority, bounded queues, early 429/503 rejection
+admission_controller = admission.from_env()
+ADMITTED_PATHS = ("/predict", "/news", "/similar")
+# Admitted in the handler, once per coalesced group (see leader_admission)
+COALESCED_PATHS = ("/predict", "/predict/async")
+
+def rejected_response(e, priority):
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"detail": e.detail, "priority": priority},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def leader_admission(request):
+    """
+    (priority, admit) for SingleFlight.do_async: only the leader of a
+    group of identical requests takes a slot, followers skip the queue
+    """
+    priority, deadline = admission_controller.classify(request.headers)
+
+    async def admit():
+        started = await admission_controller.acquire(priority, deadline)
+        return lambda: admission_controller.release(started, priority)
+
+    return priority, admit
+
+@app.middleware("http")
+async def admit_inference(request: Request, call_next):
+    path = request.url.path
+    if path in COALESCED_PATHS or not path.startswith(ADMITTED_PATHS):
+        return await call_next(request)
+
+    priority, deadline = admission_controller.classify(request.headers)
+    try:
+        started = await admission_controller.acquire(priority, deadline)
+    except admission.Rejected as e:
+        return rejected_response(e, priority)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        admission_controller.release(started, priority)
+        raise
+
+    # Streaming bodies are still being scored: hold the slot until done
+    return after_body(response, lambda: admission_controller.release(started, priority))
+
+def after_body(response, callback):
+    """
+    Run callback once the response body has been fully sent. The
+    finalizer covers bodies that are dropped before being iterated.
+    """
+    body = response.body_iterator
+    done = False
+
+    def run_once():
+        nonlocal done
+        if not done:
+            done = True
+            callback()
+
+    async def wrapped():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            run_once()
+
+    response.body_iterator = wrapped()
+    weakref.finalize(response.body_iterator, run_once)
+    return response
+
+# ---------------------------------
+# On-demand profiling
+# ---------------------------------
+# Off unless PROFILE_SAMPLE_RATE / PROFILE_WINDOW_S or /admin/profiling enable it
+profiler = profiling.from_env()
+app.add_middleware(profiling.ProfilingMiddleware, profiler=profiler)
+
 # ---------------------------------
 # Environment variable (News API)
 # ---------------------------------
 NEWSDATA_API_KEY = os.getenv("NEWSDATA_API_KEY")
 
+# Guards /models/* writes, /similar/ivf and /admin/* (unset = those endpoints are disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or os.getenv("PROFILE_ADMIN_TOKEN")
+
+def check_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Process-level CPU replicas for bulk scoring (0 = score in-process).
+# They start on INFERENCE_MODEL and follow the registry on every promotion.
+INFERENCE_REPLICAS = int(os.getenv("INFERENCE_REPLICAS", "0"))
+INFERENCE_MODEL = os.getenv("INFERENCE_MODEL", "ProsusAI/finbert")
+
+# Keep pooled embeddings of scored texts for /similar (unset = disabled)
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR")
+SIMILARITY_INDEX_DTYPE = os.getenv("SIMILARITY_INDEX_DTYPE", "float16")
+
+# ---------------------------------
+# Bulk inference
+# ---------------------------------
+replica_pool = None
+
+# Identical texts submitted concurrently share one forward pass
+coalescer = SingleFlight()
+
+replica_reload_lock = threading.Lock()
+replica_pool_lock = threading.Lock()
+
+@app.on_event("startup")
+def start_replicas():
+    global replica_pool
+    if INFERENCE_REPLICAS > 0:
+        replica_pool = ReplicaPool(INFERENCE_REPLICAS, INFERENCE_MODEL).start()
+
+@app.on_event("shutdown")
+def stop_replicas():
+    if replica_pool is not None:
+        replica_pool.close(timeout=10)
+
+@contextmanager
+def pool_in_use():
+    """
+    The current replica pool (or None), held so a reload can't close it
+    while this caller may still submit to it
+    """
+    with replica_pool_lock:
+        pool = replica_pool
+        if pool is not None:
+            pool.acquire()
+    try:
+        yield pool
+    finally:
+        if pool is not None:
+            pool.release()
+
+def reload_replicas(source):
+    """
+    Start a pool on the new weights, switch to it, then close the old one
+    once its in-flight users drain. Bulk traffic stays on the old pool
+    until the new one is warm.
+    """
+    global replica_pool
+    with replica_reload_lock:
+        if replica_pool is None or replica_pool.source == source:
+            return
+        try:
+            pool = ReplicaPool(INFERENCE_REPLICAS, source).start()
+        except Exception as e:
+            print(f"❌ Replica reload on '{source}' failed, keeping '{replica_pool.source}': {e}")
+            return
+        with replica_pool_lock:
+            old, replica_pool = replica_pool, pool
+        old.wait_drained()
+        old.close()
+
+def on_model_swap(version):
+    if replica_pool is not None:
+        threading.Thread(target=reload_replicas, args=(version.source,), daemon=True).start()
+
+registry.on_swap(on_model_swap)
+
+# Per model source: embeddings from different weights aren't comparable
+similarity_indexes = (
+    VersionedIndex(SIMILARITY_INDEX_DIR, dtype=SIMILARITY_INDEX_DTYPE)
+    if SIMILARITY_INDEX_DIR else None
+)
+
+def index_scored(source, texts, results, embeddings):
+    similarity_indexes.get(source).add(embeddings, [
+        {"text": t, "label": r["label"], "confidence": r["confidence"]}
+        for t, r in zip(texts, results)
+    ])
+
+def infer(text):
+    """
+    Single-text prediction, recording its embedding when the index is on
+    """
+    if similarity_indexes is None:
+        with profiler.forward("predict"):
+            return registry.predict(text)
+    with profiler.forward("predict"):
+        result, embedding, source = registry.predict(text, return_embedding=True)
+    index_scored(source, [text], [result], embedding[None, :])
+    return result
+
+def score_texts(texts):
+    """
+    Score many texts at once, on the replica pool when it is enabled
+    """
+    if not texts:
+        return []
+    with pool_in_use() as pool:
+        if pool is not None:
+            if similarity_indexes is None:
+                return pool.predict_batch(texts)
+            results, embeddings = pool.predict_batch(texts, return_embeddings=True)
+            index_scored(pool.source, texts, results, embeddings)
+            return results
+    if similarity_indexes is not None:
+        with profiler.forward("batch"):
+            results, embeddings, source = registry.predict_batch(texts, return_embeddings=True)
+        index_scored(source, texts, results, embeddings)
+        return results
+    with profiler.forward("batch"):
+        return registry.predict_batch(texts)
+
+@contextmanager
+def bulk_scoring():
+    """
+    Batch -> Future submit function for iter_scored when the replica pool
+    is on, so streamed batches run on all replicas at once; else None.
+    The pool stays held until the stream is done.
+    """
+    with pool_in_use() as pool:
+        yield _pool_submitter(pool) if pool is not None else None
+
+def _pool_submitter(pool):
+    if similarity_indexes is None:
+        return pool.submit
+
+    def submit(texts):
+        scored = Future()
+
+        def done(future):
+            try:
+                results, embeddings = future.result()
+                index_scored(pool.source, texts, results, embeddings)
+                scored.set_result(results)
+            except Exception as e:
+                scored.set_exception(e)
+
+        pool.submit(texts, return_embeddings=True).add_done_callback(done)
+        return scored
+
+    return submit
+
 # ---------------------------------
 # Request schema
 # ---------------------------------
 class TextRequest(BaseModel):
     text: str
 
+class BatchRequest(BaseModel):
+    texts: List[str]
+
+class ModelLoadRequest(BaseModel):
+    name: str
+    source: str
+    mode: str = "swap"  # "swap" or "shadow"
+    shadow_rate: Optional[float] = None
+
+class ShadowRequest(BaseModel):
+    rate: float
+
+class SimilarRequest(BaseModel):
+    texts: List[str]
+    k: int = Field(10, ge=1)
+    nprobe: Optional[int] = Field(None, ge=1)
+
+class IvfRequest(BaseModel):
+    n_lists: int = Field(..., ge=1)
+    iters: int = Field(10, ge=1)
+
+class ProfilingRequest(BaseModel):
+    sample_rate: Optional[float] = None
+    window_s: Optional[float] = None
+
 # ---------------------------------
 # Health check
 # ---------------------------------
@@ -33,15 +309,48 @@ def health():
 # ---------------------------------
 # Manual text prediction (existing)
 # ---------------------------------
+async def coalesced_predict(text, request):
+    # Join an in-flight identical request before admission, so a burst of
+    # the same headline queues (and runs) once
+    priority, admit = leader_admission(request)
+    try:
+        return await coalescer.do_async(
+            normalize_text(text),
+            lambda: infer(text),
+            admit=admit
+        )
+    except admission.Rejected as e:
+        return rejected_response(e, priority)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/predict")
-def predict(req: TextRequest):
+async def predict(req: TextRequest, request: Request):
     """
     Predict sentiment for a given financial text
     """
-    try:
-        return predict_sentiment(req.text)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await coalesced_predict(req.text, request)
+
+@app.post("/predict/async")
+async def predict_async(req: TextRequest, request: Request):
+    """
+    Same as /predict (kept for existing clients); both coalesce on identical text
+    """
+    return await coalesced_predict(req.text, request)
+
+@app.get("/stats/admission")
+def admission_stats():
+    """
+    Queue depth, predicted wait and rejections per priority class
+    """
+    return admission_controller.stats()
+
+@app.get("/stats/coalescing")
+def coalescing_stats():
+    """
+    How many /predict requests shared another request's inference
+    """
+    return coalescer.stats()
 
 # ---------------------------------
 # Live news sentiment (FIXED)
@@ -50,11 +359,16 @@ def predict(req: TextRequest):
 def analyze_latest_news(
     query: str = "stock",
     language: str = "en",
-    limit: int = 5
+    limit: int = 5,
+    accept: Optional[str] = Header(None)
 ):
     """
-    Fetch latest financial news and run sentiment analysis
+    Fetch latest financial news and run sentiment analysis.
+    Accept: application/x-ndjson or application/x-msgpack streams each
+    article as soon as its batch is scored.
     """
+    fmt = negotiate(accept)
+
     try:
         # If no API key, use sample data for demo
         if not NEWSDATA_API_KEY:
@@ -73,15 +387,12 @@ def analyze_latest_news(
                 "Consumer confidence reaches five-year high"
             ]
             
-            results = []
-            for title in sample_headlines[:limit]:
-                sentiment = predict_sentiment(title)
-                results.append({
-                    "title": title,
-                    "sentiment": sentiment["label"],
-                    "confidence": sentiment["confidence"],
-                    "probabilities": sentiment.get("probabilities", {})
-                })
+            titles = sample_headlines[:limit]
+
+            if fmt != "json":
+                return stream_response(news_items(titles), fmt)
+
+            results = list(news_items(titles))
             
             return {
                 "query": query,
@@ -108,8 +419,12 @@ def analyze_latest_news(
         
         data = response.json()
 
-        results = []
         articles = data.get("results", [])
+        titles = [item.get("title", "") for item in articles[:limit]]
+        titles = [t for t in titles if t]
+
+        if fmt != "json":
+            return stream_response(news_items(titles), fmt)
         
         if not articles:
             return {
@@ -119,17 +434,7 @@ def analyze_latest_news(
                 "message": "No articles found for this query"
             }
 
-        for item in articles[:limit]:
-            text = item.get("title", "")
-
-            if text:
-                sentiment = predict_sentiment(text)
-                results.append({
-                    "title": text,
-                    "sentiment": sentiment["label"],
-                    "confidence": sentiment["confidence"],
-                    "probabilities": sentiment.get("probabilities", {})
-                })
+        results = list(news_items(titles))
 
         return {
             "query": query,
@@ -142,4 +447,176 @@ def analyze_latest_news(
     except requests.exceptions.RequestException as e:
         raise HTTPException(status_code=502, detail=f"Failed to fetch news: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+
+def news_items(titles):
+    with bulk_scoring() as submit_fn:
+        for title, sentiment in iter_scored(titles, score_texts, submit_fn=submit_fn):
+            yield {
+                "title": title,
+                "sentiment": sentiment["label"],
+                "confidence": sentiment["confidence"],
+                "probabilities": sentiment.get("probabilities", {})
+            }
+
+# ---------------------------------
+# Bulk text prediction
+# ---------------------------------
+@app.post("/predict/batch")
+def predict_batch(req: BatchRequest, accept: Optional[str] = Header(None)):
+    """
+    Predict sentiment for many texts. Same negotiation as /news;
+    plain JSON returns {"results": [...]} in input order.
+    """
+    fmt = negotiate(accept)
+
+    def items():
+        with bulk_scoring() as submit_fn:
+            for text, result in iter_scored(req.texts, score_texts, submit_fn=submit_fn):
+                yield {"text": text, **result}
+
+    if fmt != "json":
+        return stream_response(items(), fmt)
+
+    try:
+        return {"results": list(items())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------------------------------
+# Model registry (hot-swap + shadow)
+# ---------------------------------
+@app.get("/models")
+def list_models():
+    """
+    Live / candidate versions, load status and shadow agreement stats
+    """
+    return registry.stats()
+
+@app.post("/models/load")
+def load_model_version(req: ModelLoadRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load and warm a model version in the background, then either swap it
+    live or keep it as a shadow candidate
+    """
+    check_admin(x_admin_token)
+    if req.mode not in ("swap", "shadow"):
+        raise HTTPException(status_code=400, detail="mode must be 'swap' or 'shadow'")
+    try:
+        registry.load(
+            req.name,
+            req.source,
+            promote=req.mode == "swap",
+            shadow_rate=req.shadow_rate
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "loading", "name": req.name, "mode": req.mode}
+
+@app.post("/models/promote")
+def promote_candidate(x_admin_token: Optional[str] = Header(None)):
+    """
+    Switch live traffic to the shadow candidate
+    """
+    check_admin(x_admin_token)
+    try:
+        registry.promote()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return registry.stats()
+
+@app.post("/models/shadow")
+def set_shadow_rate(req: ShadowRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Fraction of /predict traffic also scored on the candidate
+    """
+    check_admin(x_admin_token)
+    registry.set_shadow_rate(req.rate)
+    return {"shadow_rate": registry.shadow_rate}
+
+@app.get("/replicas")
+def replica_stats():
+    """
+    Weights the replicas serve, plus per-replica cores and outstanding rows
+    """
+    if replica_pool is None:
+        return {"enabled": False, "replicas": []}
+    pool = replica_pool
+    return {
+        "enabled": True,
+        "source": pool.source,
+        "reloading": replica_reload_lock.locked(),
+        "replicas": pool.stats()
+    }
+
+# ---------------------------------
+# Similar past headlines
+# ---------------------------------
+@app.post("/similar")
+def similar(req: SimilarRequest):
+    """
+    Top-k most similar previously scored headlines for each text, from
+    the index of the model version that embedded the query.
+    nprobe searches only the nearest IVF lists (after /similar/ivf).
+    """
+    if similarity_indexes is None:
+        raise HTTPException(status_code=404, detail="Similarity index disabled (set SIMILARITY_INDEX_DIR)")
+    if not req.texts:
+        return {"results": []}
+
+    try:
+        scored, embeddings, source = registry.predict_batch(req.texts, return_embeddings=True)
+        index = similarity_indexes.get(source)
+        matches = index.search(embeddings, k=req.k, nprobe=req.nprobe)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "results": [
+            {
+                "text": text,
+                "label": result["label"],
+                "confidence": result["confidence"],
+                "similar": [
+                    {**index.meta(row), "score": round(score, 4)}
+                    for row, score in hits
+                ]
+            }
+            for text, result, hits in zip(req.texts, scored, matches)
+        ]
+    }
+
+@app.post("/similar/ivf")
+def build_similarity_ivf(req: IvfRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    (Re)cluster the live model's index into n_lists coarse lists for fast
+    approximate search. Runs k-means in the request, so admin only.
+    """
+    check_admin(x_admin_token)
+    if similarity_indexes is None:
+        raise HTTPException(status_code=404, detail="Similarity index disabled (set SIMILARITY_INDEX_DIR)")
+    source = registry.stats()["live"]["source"]
+    index = similarity_indexes.get(source)
+    try:
+        index.build_ivf(req.n_lists, iters=req.iters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"model": source, "vectors": index.count, "n_lists": req.n_lists}
+
+# ---------------------------------
+# Profiling admin
+# ---------------------------------
+@app.get("/admin/profiling")
+def profiling_status(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    return profiler.status()
+
+@app.post("/admin/profiling")
+def configure_profiling(req: ProfilingRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Profile a sampled fraction of requests and/or every request for window_s
+    seconds. {"sample_rate": 0, "window_s": 0} switches it off.
+    """
+    check_admin(x_admin_token)
+    profiler.configure(req.sample_rate, req.window_s)
+    return profiler.status()
@@ -0,0 +1,230 @@
+# api/profiling.py
+
+import contextvars
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+_NULL = nullcontext()
+_current = contextvars.ContextVar("profile_session", default=None)
+
+# Leaf frames in these files are threads parked on a lock/selector
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "base_events.py")
+
+
+# ---------------------------------
+# Python sampling profiler
+# ---------------------------------
+class StackSampler(threading.Thread):
+    """
+    Wall-clock sampler over every thread in the process. Output is the
+    collapsed-stack format flamegraph.pl / speedscope read:
+    "thread;outer;...;leaf count".
+    """
+
+    def __init__(self, interval_s=0.005):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.interval_s = interval_s
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ---------------------------------
+# One profiled request
+# ---------------------------------
+class ProfileSession:
+    def __init__(self, out_dir, name):
+        self.out_dir = out_dir
+        self.prefix = os.path.join(out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+        self.sampler = StackSampler()
+        self._forward_count = itertools.count()
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.sampler.start()
+
+    def finish(self):
+        self.sampler.stop()
+        self.sampler.write_collapsed(f"{self.prefix}.collapsed.txt")
+
+    def write_torch(self, label, prof):
+        base = f"{self.prefix}.{label}{next(self._forward_count)}"
+        prof.export_chrome_trace(f"{base}.trace.json")
+        with open(f"{base}.ops.txt", "w", encoding="utf-8") as f:
+            f.write(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40))
+
+
+# ---------------------------------
+# Controller
+# ---------------------------------
+class Profiler:
+    """
+    Runtime-switchable profiling for sampled requests or a time window.
+
+    `active` is a plain attribute, so with profiling off the request
+    path pays one attribute read and nothing else. One session runs
+    at a time; requests sampled while another is running are skipped.
+    """
+
+    def __init__(self, out_dir="profiles", sample_rate=0.0, window_s=0.0):
+        self.out_dir = out_dir
+        self.sample_rate = 0.0
+        self.until = 0.0
+        self.active = False
+        self.sessions = 0
+        self._session_lock = threading.Lock()
+        self._torch_lock = threading.Lock()
+        self._session_ids = itertools.count()
+        self.configure(sample_rate, window_s)
+
+    def configure(self, sample_rate=None, window_s=None):
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if window_s is not None:
+            self.until = time.time() + float(window_s) if window_s > 0 else 0.0
+        self.active = self.sample_rate > 0 or self.until > time.time()
+
+    def _sampled(self):
+        if self.until:
+            if time.time() < self.until:
+                return True
+            self.until = 0.0
+            self.active = self.sample_rate > 0
+        return random.random() < self.sample_rate
+
+    def start_session(self, name):
+        """
+        New session if this request is sampled and none is running, else None
+        """
+        if not self._sampled() or not self._session_lock.acquire(blocking=False):
+            return None
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_")
+        session = ProfileSession(self.out_dir, f"{slug}-{next(self._session_ids)}")
+        session.start()
+        return session
+
+    def end_session(self, session):
+        try:
+            session.finish()
+            self.sessions += 1
+        finally:
+            self._session_lock.release()
+
+    def bind(self, session):
+        return _current.set(session)
+
+    def unbind(self, token):
+        _current.reset(token)
+
+    @contextmanager
+    def _torch_profile(self, session, label):
+        from torch import cuda
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        try:
+            with profile(activities=activities) as prof:
+                yield
+            session.write_torch(label, prof)
+        finally:
+            self._torch_lock.release()
+
+    def forward(self, label):
+        """
+        Wrap a model forward pass; torch.profiler runs only inside a
+        sampled request's session
+        """
+        if not self.active:
+            return _NULL
+        session = _current.get()
+        if session is None or not self._torch_lock.acquire(blocking=False):
+            return _NULL
+        return self._torch_profile(session, label)
+
+    def status(self):
+        traces = sorted(os.listdir(self.out_dir))[-20:] if os.path.isdir(self.out_dir) else []
+        return {
+            "active": self.active,
+            "sample_rate": self.sample_rate,
+            "window_remaining_s": round(max(0.0, self.until - time.time()), 1),
+            "out_dir": self.out_dir,
+            "sessions_written": self.sessions,
+            "recent_files": traces
+        }
+
+
+# ---------------------------------
+# ASGI middleware
+# ---------------------------------
+class ProfilingMiddleware:
+    """
+    Plain ASGI middleware rather than @app.middleware("http"): with
+    profiling off a request costs one attribute read, with no extra
+    task or wrapped body stream.
+    """
+
+    def __init__(self, app, profiler, skip_prefixes=("/admin",)):
+        self.app = app
+        self.profiler = profiler
+        self.skip_prefixes = tuple(skip_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if not profiler.active or scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            return await self.app(scope, receive, send)
+
+        session = profiler.start_session(f"{scope['method']}{scope['path']}")
+        if session is None:
+            return await self.app(scope, receive, send)
+
+        # The app returns once the whole body (streaming or not) is sent
+        token = profiler.bind(session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.unbind(token)
+            # Joining the sampler and writing files must not block the event loop
+            threading.Thread(
+                target=profiler.end_session, args=(session,), daemon=True, name="profile-writer"
+            ).start()
+
+
+def from_env():
+    return Profiler(
+        out_dir=os.getenv("PROFILE_DIR", "profiles"),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        window_s=float(os.getenv("PROFILE_WINDOW_S", "0"))
+    )
@@ -0,0 +1,131 @@
+# api/streaming.py
+
+import json
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from model.dataset import LABELS
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for Accept: application/x-msgpack
+    msgpack = None
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson")
+MSGPACK_TYPES = ("application/x-msgpack", "application/msgpack")
+
+STREAM_BATCH_SIZE = 16
+
+
+# ---------------------------------
+# Content negotiation
+# ---------------------------------
+def _accept_ranges(accept):
+    """
+    (media range, q) pairs from an Accept header; malformed q entries are ignored
+    """
+    for part in accept.split(","):
+        media, *params = [p.strip().lower() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = None
+        if media and q is not None and 0.0 <= q <= 1.0:
+            yield media, q
+
+
+def negotiate(accept):
+    """
+    "ndjson", "msgpack" or "json" by the client's q-values. Wildcards only
+    match json, and a header naming none of them keeps the json default.
+    """
+    if not accept:
+        return "json"
+
+    offers = {
+        "json": ("application/json", "application/*", "*/*"),
+        "ndjson": NDJSON_TYPES,
+        "msgpack": MSGPACK_TYPES,
+    }
+    ranges = list(_accept_ranges(accept))
+
+    # The most specific range naming a format sets its q (RFC 9110 12.5.1);
+    # ties go to the format listed first
+    scored = []
+    for fmt, types in offers.items():
+        matches = [(types.index(media), i, q) for i, (media, q) in enumerate(ranges) if media in types]
+        if matches:
+            _, position, q = min(matches)
+            scored.append((-q, position, fmt))
+    acceptable = [fmt for neg_q, _, fmt in sorted(scored) if neg_q < 0]
+
+    if not acceptable:
+        return "json"
+    if acceptable[0] == "msgpack" and msgpack is None:
+        if len(acceptable) == 1:
+            raise HTTPException(
+                status_code=406,
+                detail="MessagePack responses need the 'msgpack' package installed"
+            )
+        return acceptable[1]
+    return acceptable[0]
+
+
+# ---------------------------------
+# Incremental scoring
+# ---------------------------------
+def iter_scored(texts, score_fn, batch_size=STREAM_BATCH_SIZE, submit_fn=None):
+    """
+    Yield (text, result) as soon as each batch finishes.
+
+    With submit_fn (batch -> Future of results) every batch is queued up
+    front so replicas score them in parallel; results are still yielded
+    in input order, each as soon as its batch and all earlier ones are done.
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if submit_fn is None:
+        for batch in batches:
+            yield from zip(batch, score_fn(batch))
+        return
+
+    futures = [submit_fn(batch) for batch in batches]
+    for batch, future in zip(batches, futures):
+        yield from zip(batch, future.result())
+
+
+# ---------------------------------
+# Encoders
+# ---------------------------------
+def _ndjson_lines(items):
+    for item in items:
+        yield json.dumps(item, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _msgpack_frames(items):
+    # Header frame tells clients the order of the float32 probability arrays
+    packer = msgpack.Packer(use_bin_type=True)
+    yield packer.pack({"labels": LABELS, "probabilities": "float32-le"})
+
+    for item in items:
+        item = dict(item)
+        probs = item.pop("probabilities", {})
+        item["probabilities"] = np.asarray(
+            [probs.get(l, 0.0) for l in LABELS], dtype="<f4"
+        ).tobytes()
+        yield packer.pack(item)
+
+
+def stream_response(items, fmt):
+    """
+    Wrap a generator of result dicts in a streaming NDJSON/MessagePack body
+    """
+    if fmt == "msgpack":
+        return StreamingResponse(_msgpack_frames(items), media_type=MSGPACK_TYPES[0])
+    return StreamingResponse(_ndjson_lines(items), media_type=NDJSON_TYPES[0])
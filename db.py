@@ -1,34 +1,428 @@
+import os
 import sqlite3
+import threading
+from datetime import datetime, time, timedelta, timezone
 
 DB_PATH = "sentiment.db"
 
+# Raw rows live in one table per UTC day: sentiment_logs_YYYYMMDD.
+# Ids come from one global sequence, so they are unique across days.
+# Closed days are rolled up into per-minute and per-hour aggregates,
+# and raw partitions older than RETENTION_DAYS are dropped.
+PARTITION_PREFIX = "sentiment_logs_"
+RETENTION_DAYS = int(os.getenv("SENTIMENT_RETENTION_DAYS", "30"))
+VACUUM_PAGES = 1000
+MIGRATE_CHUNK = 10_000
+# init_db() starts one background compaction loop per DB_PATH; 0 disables it
+COMPACTION_INTERVAL_S = float(os.getenv("SENTIMENT_COMPACTION_INTERVAL_S", "3600"))
+
+_compactions = {}
+_compactions_lock = threading.Lock()
+
+
+# -------------------------------
+# Connection + time helpers
+# -------------------------------
+def _connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def to_epoch_ms(timestamp):
+    """
+    Accepts datetime, epoch seconds/ms, or ISO / "%Y-%m-%d %H:%M:%S" text
+    """
+    if timestamp is None:
+        return int(datetime.now(timezone.utc).timestamp() * 1000)
+    if isinstance(timestamp, (int, float)):
+        # Anything this large is already milliseconds
+        return int(timestamp if timestamp > 1e11 else timestamp * 1000)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.strip())
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def _iso(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _day(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime("%Y%m%d")
+
+
+# -------------------------------
+# Schema
+# -------------------------------
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     c = conn.cursor()
+
+    # Incremental vacuum only takes effect on a fresh or fully vacuumed file
+    if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        c.execute("VACUUM")
+
+    # rolled_up_id: highest id already in the rollups. Late rows for a
+    # closed day get higher ids and are picked up by the next compaction.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_partitions (
+            day TEXT PRIMARY KEY,
+            rolled_up_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
     c.execute("""
-        CREATE TABLE IF NOT EXISTS sentiment_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
+        CREATE TABLE IF NOT EXISTS sentiment_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_id INTEGER NOT NULL
+        )
+    """)
+    for grain in ("minute", "hour"):
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS sentiment_rollup_{grain} (
+                bucket INTEGER NOT NULL,
+                sentiment TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                confidence_sum REAL NOT NULL,
+                confidence_min REAL NOT NULL,
+                confidence_max REAL NOT NULL,
+                PRIMARY KEY (bucket, sentiment)
+            ) WITHOUT ROWID
+        """)
+    conn.commit()
+
+    if c.execute("SELECT 1 FROM sentiment_sequence").fetchone() is None:
+        last = max((_max_id(conn, day) for day in _all_days(conn)), default=0)
+        c.execute("INSERT INTO sentiment_sequence (id, next_id) VALUES (1, ?)", (last + 1,))
+        conn.commit()
+
+    _migrate_legacy(conn)
+    conn.close()
+
+    if COMPACTION_INTERVAL_S > 0:
+        with _compactions_lock:
+            if DB_PATH not in _compactions:
+                _compactions[DB_PATH] = start_compaction(COMPACTION_INTERVAL_S)
+
+
+def _all_days(conn):
+    return [d for (d,) in conn.execute("SELECT day FROM sentiment_partitions ORDER BY day")]
+
+
+def _max_id(conn, day):
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {PARTITION_PREFIX}{day}").fetchone()[0]
+
+
+def _partition(conn, day):
+    """
+    Create the day's table if needed. Runs inside the caller's insert
+    transaction and is never cached, so a partition dropped by compact()
+    in another process is simply recreated.
+    """
+    table = f"{PARTITION_PREFIX}{day}"
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
             text TEXT,
             sentiment TEXT,
             confidence REAL
         )
     """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (ts)")
+    conn.execute("INSERT OR IGNORE INTO sentiment_partitions (day) VALUES (?)", (day,))
+    return table
+
+
+def _migrate_legacy(conn):
+    """
+    Move rows from the old single sentiment_logs table (text timestamps)
+    into day partitions, then drop it
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sentiment_logs'"
+    ).fetchone()
+    if not exists:
+        return
+
+    # Chunked so a large table never sits in memory at once. Each chunk is
+    # deleted from the legacy table in the same transaction that inserts
+    # it, so an interrupted migration resumes without duplicates.
+    moved, skipped, last_id = 0, 0, 0
+    while True:
+        chunk = conn.execute("""
+            SELECT id, timestamp, text, sentiment, confidence FROM sentiment_logs
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, MIGRATE_CHUNK)).fetchall()
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        rows, row_ids = [], []
+        for row_id, timestamp, text, sentiment, confidence in chunk:
+            try:
+                ts = to_epoch_ms(timestamp)
+            except (TypeError, ValueError):
+                if skipped < 10:
+                    print(f"⚠️ Legacy sentiment_logs row {row_id}: unparseable timestamp {timestamp!r}")
+                skipped += 1
+                continue
+            rows.append((ts, text, sentiment, confidence))
+            row_ids.append((row_id,))
+
+        with conn:
+            _insert_many(conn, rows)
+            conn.executemany("DELETE FROM sentiment_logs WHERE id = ?", row_ids)
+        moved += len(rows)
+
+    if skipped:
+        # Keep what couldn't be parsed rather than blocking startup or losing it
+        conn.execute("ALTER TABLE sentiment_logs RENAME TO sentiment_logs_unparsed")
+        print(f"⚠️ Kept {skipped} legacy rows with bad timestamps in sentiment_logs_unparsed")
+    else:
+        conn.execute("DROP TABLE sentiment_logs")
     conn.commit()
-    conn.close()
+    print(f"✅ Migrated {moved} legacy sentiment_logs rows into day partitions")
+
+
+# -------------------------------
+# Writes
+# -------------------------------
+def _next_ids(conn, n):
+    """
+    Reserve n ids from the global sequence; returns the first. The UPDATE
+    takes the write lock, so the reservation commits with the rows.
+    """
+    conn.execute("UPDATE sentiment_sequence SET next_id = next_id + ? WHERE id = 1", (n,))
+    return conn.execute("SELECT next_id FROM sentiment_sequence WHERE id = 1").fetchone()[0] - n
+
+
+def _record_ts(timestamp):
+    """
+    to_epoch_ms for live inserts, which accept any text like the old
+    TEXT column did: a bare time of day ("12:30:01") is placed on the
+    current UTC date, anything else unparseable gets the insert time
+    """
+    try:
+        return to_epoch_ms(timestamp)
+    except ValueError:
+        pass
+    try:
+        clock = time.fromisoformat(timestamp.strip())
+        return to_epoch_ms(datetime.combine(datetime.now(timezone.utc).date(), clock))
+    except ValueError:
+        print(f"⚠️ Unparseable sentiment log timestamp {timestamp!r}, using insert time")
+        return to_epoch_ms(None)
+
+
+def _insert_many(conn, records):
+    rows = [
+        (_record_ts(timestamp), text, sentiment, confidence)
+        for timestamp, text, sentiment, confidence in records
+    ]
+    if not rows:
+        return
+
+    by_day = {}
+    for row_id, (ts, text, sentiment, confidence) in enumerate(rows, start=_next_ids(conn, len(rows))):
+        by_day.setdefault(_day(ts), []).append((row_id, ts, text, sentiment, confidence))
+
+    for day, day_rows in by_day.items():
+        conn.executemany(f"""
+            INSERT INTO {_partition(conn, day)} (id, ts, text, sentiment, confidence)
+            VALUES (?, ?, ?, ?, ?)
+        """, day_rows)
+
 
 def insert_record(timestamp, text, sentiment, confidence):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO sentiment_logs (timestamp, text, sentiment, confidence)
-        VALUES (?, ?, ?, ?)
-    """, (timestamp, text, sentiment, confidence))
+    """
+    timestamp: datetime, epoch seconds/ms, ISO text or None for now.
+    Naive values are UTC; see _record_ts for time-only and free text
+    """
+    conn = _connect()
+    _insert_many(conn, [(timestamp, text, sentiment, confidence)])
+    conn.commit()
+    conn.close()
+
+
+def insert_records(records):
+    """
+    Bulk insert of (timestamp, text, sentiment, confidence) tuples in one transaction
+    """
+    conn = _connect()
+    _insert_many(conn, records)
     conn.commit()
     conn.close()
 
+
+# -------------------------------
+# Reads (one API across partitions)
+# -------------------------------
+def _days_in_range(conn, start_ms, end_ms):
+    days = _all_days(conn)
+    start_day = _day(start_ms) if start_ms is not None else None
+    end_day = _day(end_ms) if end_ms is not None else None
+    return [
+        d for d in days
+        if (start_day is None or d >= start_day) and (end_day is None or d <= end_day)
+    ]
+
+
+def fetch_range(start=None, end=None, sentiment=None, limit=None):
+    """
+    Raw rows in [start, end), newest first, as
+    (id, timestamp, text, sentiment, confidence) with ISO UTC timestamps
+    """
+    start_ms = to_epoch_ms(start) if start is not None else None
+    end_ms = to_epoch_ms(end) if end is not None else None
+
+    conn = _connect()
+    days = _days_in_range(conn, start_ms, end_ms)
+    if not days:
+        conn.close()
+        return []
+
+    where, params = [], []
+    if start_ms is not None:
+        where.append("ts >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        where.append("ts < ?")
+        params.append(end_ms)
+    if sentiment is not None:
+        where.append("sentiment = ?")
+        params.append(sentiment)
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+    query = " UNION ALL ".join(
+        f"SELECT id, ts, text, sentiment, confidence FROM {PARTITION_PREFIX}{d}{clause}"
+        for d in days
+    ) + " ORDER BY ts DESC, id DESC"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+
+    rows = conn.execute(query, params * len(days)).fetchall()
+    conn.close()
+    return [(row_id, _iso(ts), text, s, conf) for row_id, ts, text, s, conf in rows]
+
+
 def fetch_all():
-    conn = sqlite3.connect(DB_PATH)
-    df = conn.execute("SELECT * FROM sentiment_logs ORDER BY id DESC").fetchall()
+    return fetch_range()
+
+
+def fetch_rollups(start=None, end=None, granularity="minute"):
+    """
+    Aggregates as (bucket, sentiment, count, avg, min, max confidence).
+    Only closed, compacted days appear here.
+    """
+    if granularity not in ("minute", "hour"):
+        raise ValueError("granularity must be 'minute' or 'hour'")
+
+    where, params = [], []
+    if start is not None:
+        where.append("bucket >= ?")
+        params.append(to_epoch_ms(start))
+    if end is not None:
+        where.append("bucket < ?")
+        params.append(to_epoch_ms(end))
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+    conn = _connect()
+    rows = conn.execute(f"""
+        SELECT bucket, sentiment, count, confidence_sum / count, confidence_min, confidence_max
+        FROM sentiment_rollup_{granularity}{clause}
+        ORDER BY bucket, sentiment
+    """, params).fetchall()
+    conn.close()
+    return [(_iso(bucket), *rest) for bucket, *rest in rows]
+
+
+# -------------------------------
+# Compaction
+# -------------------------------
+def _rollup(conn, table, grain_ms, target, after_id, upto_id):
+    conn.execute(f"""
+        INSERT INTO {target}
+            (bucket, sentiment, count, confidence_sum, confidence_min, confidence_max)
+        SELECT (ts / {grain_ms}) * {grain_ms}, sentiment, COUNT(*),
+               SUM(confidence), MIN(confidence), MAX(confidence)
+        FROM {table}
+        WHERE sentiment IS NOT NULL AND confidence IS NOT NULL
+          AND id > ? AND id <= ?
+        GROUP BY 1, 2
+        ON CONFLICT (bucket, sentiment) DO UPDATE SET
+            count = count + excluded.count,
+            confidence_sum = confidence_sum + excluded.confidence_sum,
+            confidence_min = MIN(confidence_min, excluded.confidence_min),
+            confidence_max = MAX(confidence_max, excluded.confidence_max)
+    """, (after_id, upto_id))
+
+
+def compact(retention_days=RETENTION_DAYS, now=None, path=None):
+    """
+    Roll closed days into minute/hour aggregates, drop raw partitions
+    past retention, then give freed pages back to the filesystem
+    """
+    now = now or datetime.now(timezone.utc)
+    today = now.strftime("%Y%m%d")
+    cutoff = (now - timedelta(days=retention_days)).strftime("%Y%m%d")
+
+    conn = _connect(path)
+    pending = conn.execute(
+        "SELECT day, rolled_up_id FROM sentiment_partitions WHERE day < ? ORDER BY day",
+        (today,)
+    ).fetchall()
+
+    rolled, dropped = 0, 0
+    for day, rolled_up_id in pending:
+        table = f"{PARTITION_PREFIX}{day}"
+
+        # One transaction per day: the rollup and its watermark commit together.
+        # Ids only grow, so rows past the watermark are exactly the new ones,
+        # including late or backfilled rows for an already rolled-up day.
+        with conn:
+            last_id = _max_id(conn, day)
+            if last_id > rolled_up_id:
+                _rollup(conn, table, 60_000, "sentiment_rollup_minute", rolled_up_id, last_id)
+                _rollup(conn, table, 3_600_000, "sentiment_rollup_hour", rolled_up_id, last_id)
+                conn.execute(
+                    "UPDATE sentiment_partitions SET rolled_up_id = ? WHERE day = ?",
+                    (last_id, day)
+                )
+                rolled += 1
+
+            if day < cutoff:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute("DELETE FROM sentiment_partitions WHERE day = ?", (day,))
+                dropped += 1
+
+    # Release free pages in small steps so writers are never blocked for long
+    while dropped and conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
     conn.close()
-    return df
+
+    return {"rolled_up": rolled, "dropped": dropped}
+
+
+def start_compaction(interval_s=3600, retention_days=RETENTION_DAYS):
+    """
+    Run compact() on the current DB_PATH every interval_s seconds on a
+    daemon thread; set the returned event to stop it
+    """
+    stop = threading.Event()
+    path = DB_PATH
+
+    def loop():
+        while not stop.wait(interval_s):
+            try:
+                result = compact(retention_days, path=path)
+                if result["rolled_up"] or result["dropped"]:
+                    print(f"♻️ Sentiment log compaction: {result}")
+            except sqlite3.Error as e:
+                print(f"⚠️ Sentiment log compaction failed: {e}")
+
+    threading.Thread(target=loop, daemon=True, name="sentiment-compaction").start()
+    return stop
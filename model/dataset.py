@@ -0,0 +1,54 @@
+import csv
+import random
+
+DATA_PATH = "data/financial_sentiment.csv"
+
+LABELS = ["negative", "neutral", "positive"]
+LABEL_MAP = {label: i for i, label in enumerate(LABELS)}
+
+
+def load_financial_sentiment(path=DATA_PATH):
+    """
+    Read the labeled CSV into (texts, labels) with integer labels
+    """
+    texts, labels = [], []
+
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = row.get("Sentence") or row.get("text") or ""
+            label = str(row.get("Sentiment") or row.get("label") or "").lower()
+
+            if text and label in LABEL_MAP:
+                texts.append(text)
+                labels.append(LABEL_MAP[label])
+
+    return texts, labels
+
+
+def train_test_split(texts, labels, test_size=0.2, seed=42):
+    """
+    Deterministic split so every script evaluates on the same held-out rows
+    """
+    order = list(range(len(texts)))
+    random.Random(seed).shuffle(order)
+
+    n_test = int(len(order) * test_size)
+    test_idx, train_idx = order[:n_test], order[n_test:]
+
+    def take(idx):
+        return [texts[i] for i in idx], [labels[i] for i in idx]
+
+    return take(train_idx), take(test_idx)
+
+
+def label_order(config):
+    """
+    Label name for each output index of a model, from its config.id2label.
+    ProsusAI/finbert is positive/negative/neutral while our fine-tuned
+    checkpoints use LABELS order; generic LABEL_0.. names fall back to LABELS.
+    """
+    id2label = getattr(config, "id2label", None) or {}
+    names = [str(id2label.get(i, "")).lower() for i in range(len(id2label))]
+    if sorted(names) == sorted(LABELS):
+        return names
+    return list(LABELS)
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from model.dataset import LABELS, LABEL_MAP, label_order, load_financial_sentiment, train_test_split
+
+EARLY_EXIT_DIR = "finbert_early_exit"
+DEFAULT_EXIT_LAYERS = (2, 4, 6, 8, 10)
+DEFAULT_THRESHOLD = float(os.getenv("EARLY_EXIT_THRESHOLD", "0.9"))
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+# ---------------------------------
+# Exit head
+# ---------------------------------
+class ExitHead(nn.Module):
+    """
+    Small classifier on the [CLS] state of an intermediate layer.
+    Same shape as BERT's pooler + classifier so heads stay cheap.
+    """
+
+    def __init__(self, hidden_size, num_labels):
+        super().__init__()
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.classifier = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, cls_state):
+        return self.classifier(torch.tanh(self.dense(cls_state)))
+
+
+# ---------------------------------
+# Early-exit wrapper
+# ---------------------------------
+class EarlyExitFinBERT(nn.Module):
+    """
+    Runs the FinBERT encoder layer by layer and lets each sample leave
+    at the first exit head whose top probability reaches the threshold.
+    The last layer always uses the original pooler + classifier, so a
+    threshold above 1.0 reproduces the full model.
+    """
+
+    def __init__(self, backbone, exit_layers=DEFAULT_EXIT_LAYERS):
+        super().__init__()
+        config = backbone.config
+
+        self.backbone = backbone
+        self.exit_layers = sorted(int(l) for l in exit_layers)
+        self.num_layers = config.num_hidden_layers
+        self.heads = nn.ModuleDict({
+            str(l): ExitHead(config.hidden_size, config.num_labels)
+            for l in self.exit_layers
+        })
+
+    # -------- loading / saving --------
+    @classmethod
+    def from_pretrained(cls, path=EARLY_EXIT_DIR, dtype=None):
+        with open(os.path.join(path, "early_exit_config.json")) as f:
+            cfg = json.load(f)
+
+        backbone = AutoModelForSequenceClassification.from_pretrained(
+            cfg["backbone"],
+            use_safetensors=True
+        )
+        model = cls(backbone, cfg["exit_layers"])
+        state = torch.load(os.path.join(path, "heads.pt"), map_location="cpu")
+        model.heads.load_state_dict(state)
+
+        if dtype is not None:
+            model.to(dtype)
+
+        return model
+
+    def save_heads(self, path, backbone_name):
+        os.makedirs(path, exist_ok=True)
+        torch.save(self.heads.state_dict(), os.path.join(path, "heads.pt"))
+
+        with open(os.path.join(path, "early_exit_config.json"), "w") as f:
+            json.dump(
+                {"backbone": backbone_name, "exit_layers": self.exit_layers},
+                f,
+                indent=2
+            )
+
+    # -------- helpers --------
+    @staticmethod
+    def _run_layer(layer, hidden, ext_mask):
+        out = layer(hidden, attention_mask=ext_mask)
+        return out[0] if isinstance(out, tuple) else out
+
+    def _final_logits(self, hidden):
+        bert = self.backbone.bert
+        pooled = bert.pooler(hidden)
+        return self.backbone.classifier(self.backbone.dropout(pooled))
+
+    def exit_logits(self, hidden_states):
+        """
+        Logits from every exit head plus the final classifier.
+        Used for training: hidden_states comes from output_hidden_states=True.
+        """
+        logits = [
+            self.heads[str(l)](hidden_states[l][:, 0])
+            for l in self.exit_layers
+        ]
+        logits.append(self._final_logits(hidden_states[-1]))
+        return logits
+
+    # -------- inference --------
+    @torch.no_grad()
+    def forward(self, input_ids, attention_mask, token_type_ids=None,
+                threshold=DEFAULT_THRESHOLD):
+        """
+        Returns (probs, exit_layer) for the whole batch.
+
+        Exited rows are removed from the working batch, and the padding
+        columns no remaining row needs are trimmed, so the rest of the
+        batch keeps running on a smaller tensor. Rows never attend to
+        each other, which is what makes per-row exits safe under padding.
+        """
+        bert = self.backbone.bert
+        batch_size = input_ids.size(0)
+
+        probs_out = torch.zeros(
+            batch_size, self.backbone.config.num_labels, device=input_ids.device
+        )
+        layer_out = torch.full(
+            (batch_size,), self.num_layers, dtype=torch.long, device=input_ids.device
+        )
+
+        hidden = bert.embeddings(input_ids=input_ids, token_type_ids=token_type_ids)
+        mask = attention_mask
+        rows = torch.arange(batch_size, device=input_ids.device)
+
+        for i, layer in enumerate(bert.encoder.layer, start=1):
+            ext_mask = bert.get_extended_attention_mask(mask, mask.shape)
+            hidden = self._run_layer(layer, hidden, ext_mask)
+
+            if i == self.num_layers:
+                probs = F.softmax(self._final_logits(hidden).float(), dim=-1)
+                probs_out[rows] = probs
+                break
+
+            if str(i) not in self.heads:
+                continue
+
+            probs = F.softmax(self.heads[str(i)](hidden[:, 0]).float(), dim=-1)
+            done = probs.max(dim=-1).values >= threshold
+
+            if done.any():
+                probs_out[rows[done]] = probs[done]
+                layer_out[rows[done]] = i
+
+                keep = ~done
+                if not keep.any():
+                    break
+
+                rows, hidden, mask = rows[keep], hidden[keep], mask[keep]
+
+                # Right-padded batch: drop columns past the longest survivor
+                max_len = int(mask.sum(dim=1).max())
+                hidden, mask = hidden[:, :max_len], mask[:, :max_len]
+
+        return probs_out, layer_out
+
+
+# ---------------------------------
+# Loading + prediction
+# ---------------------------------
+_loaded = {}  # abspath -> (tokenizer, model)
+
+
+def load_early_exit(path=EARLY_EXIT_DIR):
+    key = os.path.abspath(path)
+
+    if key not in _loaded:
+        with open(os.path.join(path, "early_exit_config.json")) as f:
+            backbone_name = json.load(f)["backbone"]
+
+        dtype = torch.float16 if device.type == "cuda" else torch.float32
+        tokenizer = AutoTokenizer.from_pretrained(backbone_name, use_fast=True)
+        model = EarlyExitFinBERT.from_pretrained(path, dtype=dtype).to(device)
+        model.eval()
+        _loaded[key] = (tokenizer, model)
+
+    return _loaded[key]
+
+
+def predict_sentiment_early_exit(texts, threshold=DEFAULT_THRESHOLD):
+    """
+    Batched early-exit prediction. Same result shape as predict_sentiment,
+    with the exit layer added.
+    """
+    tokenizer, model = load_early_exit()
+
+    inputs = tokenizer(
+        texts,
+        return_tensors="pt",
+        truncation=True,
+        padding=True,
+        max_length=128
+    )
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+
+    probs, layers = model(**inputs, threshold=threshold)
+    index = {label: i for i, label in enumerate(label_order(model.backbone.config))}
+
+    results = []
+    for row, exit_layer in zip(probs.tolist(), layers.tolist()):
+        probabilities = {label: float(row[index[label]]) for label in LABELS}
+        label = max(probabilities, key=probabilities.get)
+        results.append({
+            "label": label,
+            "confidence": round(probabilities[label], 4),
+            "probabilities": probabilities,
+            "exit_layer": exit_layer
+        })
+
+    return results
+
+
+# ---------------------------------
+# Accuracy vs speed report
+# ---------------------------------
+def report(thresholds, batch_size=32, path=EARLY_EXIT_DIR):
+    tokenizer, model = load_early_exit(path)
+    _, (texts, labels) = train_test_split(*load_financial_sentiment())
+
+    # Model output index -> dataset label id
+    to_dataset = [LABEL_MAP[label] for label in label_order(model.backbone.config)]
+
+    print(f"Held-out samples: {len(texts)}")
+    print(f"{'threshold':>10} {'accuracy':>9} {'avg_layers':>11} {'samples/s':>10} {'speedup':>8}")
+
+    # One untimed full-depth batch so lazy init / CUDA warm-up doesn't
+    # land on the first (baseline) threshold
+    warm = tokenizer(
+        texts[:batch_size],
+        return_tensors="pt",
+        truncation=True,
+        padding=True,
+        max_length=128
+    )
+    model(**{k: v.to(device) for k, v in warm.items()}, threshold=float("inf"))
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+    baseline = None
+    for threshold in thresholds:
+        correct, layer_sum = 0, 0
+        start = time.perf_counter()
+
+        for i in range(0, len(texts), batch_size):
+            batch = tokenizer(
+                texts[i:i + batch_size],
+                return_tensors="pt",
+                truncation=True,
+                padding=True,
+                max_length=128
+            )
+            batch = {k: v.to(device) for k, v in batch.items()}
+            probs, layers = model(**batch, threshold=threshold)
+
+            preds = [to_dataset[p] for p in probs.argmax(dim=-1).tolist()]
+            correct += sum(p == y for p, y in zip(preds, labels[i:i + batch_size]))
+            layer_sum += int(layers.sum())
+
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        elapsed = time.perf_counter() - start
+        throughput = len(texts) / elapsed
+
+        # Threshold > 1.0 never exits early: that's the full-model baseline
+        if baseline is None and threshold > 1.0:
+            baseline = throughput
+        speedup = throughput / baseline if baseline else float("nan")
+
+        print(
+            f"{threshold:>10.2f} {correct / len(texts):>9.4f} "
+            f"{layer_sum / len(texts):>11.2f} {throughput:>10.1f} {speedup:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Early-exit accuracy vs speed curve")
+    parser.add_argument("--path", default=EARLY_EXIT_DIR)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--thresholds",
+        default="1.01,0.99,0.97,0.95,0.9,0.85,0.8,0.7,0.6",
+        help="Comma-separated; keep 1.01 first as the full-model baseline"
+    )
+    args = parser.parse_args()
+
+    report(
+        [float(t) for t in args.thresholds.split(",")],
+        batch_size=args.batch_size,
+        path=args.path
+    )
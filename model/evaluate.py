@@ -0,0 +1,222 @@
+import argparse
+import json
+import sys
+import time
+
+import torch
+
+from model.dataset import LABELS, load_financial_sentiment, train_test_split
+
+REFERENCE = "fp32"
+
+# ---------------------------------
+# Backends
+# ---------------------------------
+# name -> factory returning predict(texts) -> list of predict_sentiment-style
+# dicts. New inference variants (quantized, exported, distilled, truncated)
+# register here and get gated against the fp32 reference.
+BACKENDS = {}
+
+
+def register_backend(name):
+    def wrap(factory):
+        BACKENDS[name] = factory
+        return factory
+    return wrap
+
+
+def _transformers_backend(source, dtype):
+    from model.sentiment_model import load_model, predict_batch_with
+
+    tokenizer, model = load_model(source, dtype=dtype)
+    return lambda texts: predict_batch_with(tokenizer, model, texts)
+
+
+@register_backend("fp32")
+def fp32_backend():
+    from model.sentiment_model import MODEL_NAME
+    return _transformers_backend(MODEL_NAME, torch.float32)
+
+
+@register_backend("fp16")
+def fp16_backend():
+    # What the API serves by default
+    from model.sentiment_model import MODEL_NAME
+    return _transformers_backend(MODEL_NAME, torch.float16)
+
+
+@register_backend("trained")
+def trained_backend():
+    return _transformers_backend("finbert_trained", torch.float32)
+
+
+@register_backend("early_exit")
+def early_exit_backend():
+    from model.early_exit import predict_sentiment_early_exit
+    return predict_sentiment_early_exit
+
+
+# ---------------------------------
+# Metrics
+# ---------------------------------
+def confusion_matrix(y_true, y_pred, n=len(LABELS)):
+    matrix = [[0] * n for _ in range(n)]
+    for t, p in zip(y_true, y_pred):
+        matrix[t][p] += 1
+    return matrix
+
+
+def macro_f1(matrix):
+    scores = []
+    for c in range(len(matrix)):
+        tp = matrix[c][c]
+        fp = sum(matrix[r][c] for r in range(len(matrix))) - tp
+        fn = sum(matrix[c]) - tp
+        denom = 2 * tp + fp + fn
+        scores.append(2 * tp / denom if denom else 0.0)
+    return sum(scores) / len(scores)
+
+
+def evaluate_backend(predict, texts, labels, batch_size):
+    # One warm-up batch so lazy init / CUDA kernels don't count
+    predict(texts[:batch_size])
+
+    preds = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        preds.extend(
+            LABELS.index(r["label"]) for r in predict(texts[i:i + batch_size])
+        )
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    elapsed = time.perf_counter() - start
+
+    matrix = confusion_matrix(labels, preds)
+    return preds, {
+        "accuracy": sum(m[i] for i, m in enumerate(matrix)) / len(labels),
+        "macro_f1": macro_f1(matrix),
+        "confusion": matrix,
+        "throughput": len(texts) / elapsed
+    }
+
+
+def pareto_front(results):
+    """
+    Variants not beaten on both accuracy and throughput by another one
+    """
+    front = set()
+    for name, r in results.items():
+        dominated = any(
+            o["accuracy"] >= r["accuracy"] and o["throughput"] >= r["throughput"]
+            and (o["accuracy"] > r["accuracy"] or o["throughput"] > r["throughput"])
+            for other, o in results.items() if other != name
+        )
+        if not dominated:
+            front.add(name)
+    return front
+
+
+# ---------------------------------
+# Report + gate
+# ---------------------------------
+def print_report(results):
+    front = pareto_front(results)
+    ordered = sorted(results.items(), key=lambda kv: -kv[1]["throughput"])
+
+    print(f"\n{'backend':<14} {'accuracy':>9} {'macro_f1':>9} {'agree':>7} {'samples/s':>10}  pareto")
+    for name, r in ordered:
+        agree = f"{r['agreement']:.4f}" if r["agreement"] is not None else "-"
+        print(
+            f"{name:<14} {r['accuracy']:>9.4f} {r['macro_f1']:>9.4f} {agree:>7} "
+            f"{r['throughput']:>10.1f}  {'*' if name in front else ''}"
+        )
+
+    for name, r in ordered:
+        print(f"\n{name} confusion (rows = true, cols = predicted: {', '.join(LABELS)})")
+        for label, row in zip(LABELS, r["confusion"]):
+            print(f"  {label:<9} {row}")
+
+
+def check_thresholds(results, min_accuracy, max_accuracy_drop, min_agreement):
+    failures = []
+    ref_acc = results.get(REFERENCE, {}).get("accuracy")
+
+    for name, r in results.items():
+        if min_accuracy is not None and r["accuracy"] < min_accuracy:
+            failures.append(f"{name}: accuracy {r['accuracy']:.4f} < {min_accuracy}")
+        if max_accuracy_drop is not None and ref_acc is not None \
+                and ref_acc - r["accuracy"] > max_accuracy_drop:
+            failures.append(
+                f"{name}: accuracy drop {ref_acc - r['accuracy']:.4f} > {max_accuracy_drop}"
+            )
+        if min_agreement is not None and r["agreement"] is not None \
+                and r["agreement"] < min_agreement:
+            failures.append(f"{name}: agreement {r['agreement']:.4f} < {min_agreement}")
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy regression gate for inference backends")
+    parser.add_argument("--backends", default="fp32,fp16",
+                        help=f"Comma-separated, from: {', '.join(BACKENDS)}")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate only the first N held-out rows")
+    parser.add_argument("--min-accuracy", type=float, default=None)
+    parser.add_argument("--max-accuracy-drop", type=float, default=None,
+                        help="Allowed accuracy drop vs the fp32 reference")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Minimum prediction agreement with the fp32 reference")
+    parser.add_argument("--json", default=None, help="Also write results to this file")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.backends.split(",") if n.strip()]
+    unknown = [n for n in names if n not in BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backends: {', '.join(unknown)}")
+
+    # Reference always runs first so agreement can be computed
+    if REFERENCE in names:
+        names.remove(REFERENCE)
+    names.insert(0, REFERENCE)
+
+    _, (texts, labels) = train_test_split(*load_financial_sentiment())
+    if args.limit:
+        texts, labels = texts[:args.limit], labels[:args.limit]
+    print(f"Held-out samples: {len(texts)}")
+
+    results, reference_preds = {}, None
+    for name in names:
+        print(f"⏳ Evaluating {name}...")
+        preds, metrics = evaluate_backend(BACKENDS[name](), texts, labels, args.batch_size)
+
+        if reference_preds is None:
+            reference_preds = preds
+            metrics["agreement"] = None
+        else:
+            metrics["agreement"] = sum(
+                p == q for p, q in zip(preds, reference_preds)
+            ) / len(preds)
+
+        results[name] = metrics
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = check_thresholds(
+        results, args.min_accuracy, args.max_accuracy_drop, args.min_agreement
+    )
+    if failures:
+        print("\n❌ Regression gate failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("\n✅ Regression gate passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import gc
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from model import sentiment_model
+
+WARMUP_TEXTS = [
+    "Tech stocks rally as earnings beat expectations",
+    "Oil prices decline amid global demand concerns",
+    "The company will hold its annual general meeting in March"
+]
+
+
+# ---------------------------------
+# One loaded model version
+# ---------------------------------
+class ModelVersion:
+    def __init__(self, name, source, tokenizer, model):
+        self.name = name
+        self.source = source
+        self.tokenizer = tokenizer
+        self.model = model
+        self.loaded_at = time.time()
+        self.inflight = 0
+        self._drained = threading.Condition()
+
+    def acquire(self):
+        with self._drained:
+            self.inflight += 1
+
+    def release(self):
+        with self._drained:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self._drained.notify_all()
+
+    def wait_drained(self):
+        with self._drained:
+            while self.inflight > 0:
+                self._drained.wait()
+
+    def predict(self, text):
+        return sentiment_model.predict_with(self.tokenizer, self.model, text)
+
+    def predict_batch(self, texts, return_embeddings=False):
+        return sentiment_model.predict_batch_with(
+            self.tokenizer, self.model, texts, return_embeddings=return_embeddings
+        )
+
+    def warm(self):
+        for text in WARMUP_TEXTS:
+            self.predict(text)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    def free(self):
+        self.model = None
+        self.tokenizer = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def info(self):
+        return {
+            "name": self.name,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "inflight": self.inflight
+        }
+
+
+# ---------------------------------
+# Shadow scoring stats
+# ---------------------------------
+class ShadowStats:
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.scored = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.live_ms = deque(maxlen=window)
+        self.shadow_ms = deque(maxlen=window)
+
+    def record(self, agreed, live_ms, shadow_ms):
+        with self.lock:
+            self.scored += 1
+            self.agreed += int(agreed)
+            self.live_ms.append(live_ms)
+            self.shadow_ms.append(shadow_ms)
+
+    @staticmethod
+    def _percentile(values, q):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "scored": self.scored,
+                "dropped": self.dropped,
+                "agreement": round(self.agreed / self.scored, 4) if self.scored else None,
+                "live_ms": {
+                    "p50": self._percentile(self.live_ms, 0.5),
+                    "p95": self._percentile(self.live_ms, 0.95)
+                },
+                "shadow_ms": {
+                    "p50": self._percentile(self.shadow_ms, 0.5),
+                    "p95": self._percentile(self.shadow_ms, 0.95)
+                }
+            }
+
+
+# ---------------------------------
+# Registry
+# ---------------------------------
+class ModelRegistry:
+    """
+    Holds the live model plus at most one candidate.
+
+    New versions load and warm on a background thread. Promotion is a
+    single reference swap under a lock; the old version is freed once
+    its in-flight requests drain. A candidate can also be scored in
+    shadow on a sampled fraction of traffic, off the request path.
+    """
+
+    def __init__(self, live, max_shadow_backlog=64):
+        self._lock = threading.Lock()
+        self._live = live
+        self._candidate = None
+        self._loading = {}
+        self._history = []
+        self._swap_listeners = []
+
+        self.shadow_rate = 0.0
+        self.shadow_stats = ShadowStats()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_backlog = 0
+        self._max_shadow_backlog = max_shadow_backlog
+
+    # -------- request path --------
+    def _acquire_live(self):
+        # Read + acquire under the lock so a concurrent swap can't
+        # free the version between the two steps
+        with self._lock:
+            version = self._live
+            version.acquire()
+        return version
+
+    def predict(self, text, return_embedding=False):
+        """
+        With return_embedding, (result, embedding, source): the source says
+        which weights produced the embedding, even across a concurrent swap
+        """
+        version = self._acquire_live()
+        try:
+            start = time.perf_counter()
+            if return_embedding:
+                results, embeddings = version.predict_batch([text], return_embeddings=True)
+                result, embedding = results[0], embeddings[0]
+            else:
+                result = version.predict(text)
+            live_ms = (time.perf_counter() - start) * 1000
+        finally:
+            version.release()
+
+        self._maybe_shadow(text, result, live_ms)
+        if return_embedding:
+            return result, embedding, version.source
+        return result
+
+    def predict_batch(self, texts, return_embeddings=False):
+        # Bulk path: not shadow-sampled. Embeddings come back as
+        # (results, embeddings, source), like predict()
+        version = self._acquire_live()
+        try:
+            if return_embeddings:
+                results, embeddings = version.predict_batch(texts, return_embeddings=True)
+                return results, embeddings, version.source
+            return version.predict_batch(texts)
+        finally:
+            version.release()
+
+    # -------- shadow mode --------
+    def _maybe_shadow(self, text, live_result, live_ms):
+        if self._candidate is None or random.random() >= self.shadow_rate:
+            return
+
+        with self._lock:
+            candidate = self._candidate
+            if candidate is None:
+                return
+            if self._shadow_backlog >= self._max_shadow_backlog:
+                self.shadow_stats.dropped += 1
+                return
+            candidate.acquire()
+            self._shadow_backlog += 1
+
+        self._shadow_pool.submit(self._shadow_score, candidate, text, live_result, live_ms)
+
+    def _shadow_score(self, candidate, text, live_result, live_ms):
+        try:
+            start = time.perf_counter()
+            result = candidate.predict(text)
+            shadow_ms = (time.perf_counter() - start) * 1000
+            self.shadow_stats.record(result["label"] == live_result["label"], live_ms, shadow_ms)
+        except Exception as e:
+            print(f"⚠️ Shadow scoring failed on {candidate.name}: {e}")
+        finally:
+            candidate.release()
+            with self._lock:
+                self._shadow_backlog -= 1
+
+    def set_shadow_rate(self, rate):
+        self.shadow_rate = min(max(float(rate), 0.0), 1.0)
+
+    # -------- loading / swapping --------
+    def load(self, name, source, promote=True, shadow_rate=None):
+        """
+        Load + warm a version in the background. If promote is False it
+        becomes the shadow candidate instead of going live.
+        """
+        with self._lock:
+            if self._loading.get(name) == "loading":
+                raise ValueError(f"Model version '{name}' is already loading")
+            self._loading[name] = "loading"
+
+        thread = threading.Thread(
+            target=self._load_worker,
+            args=(name, source, promote, shadow_rate),
+            daemon=True
+        )
+        thread.start()
+
+    def _load_worker(self, name, source, promote, shadow_rate):
+        try:
+            tokenizer, model = sentiment_model.load_model(source)
+            version = ModelVersion(name, source, tokenizer, model)
+            version.warm()
+        except Exception as e:
+            self._loading[name] = f"failed: {e}"
+            print(f"❌ Failed to load model version '{name}': {e}")
+            return
+
+        if promote:
+            self._swap(version)
+        else:
+            with self._lock:
+                old = self._candidate
+                self._candidate = version
+                self.shadow_stats = ShadowStats()
+            if shadow_rate is not None:
+                self.set_shadow_rate(shadow_rate)
+            if old is not None:
+                self._retire(old)
+
+        self._loading[name] = "ready"
+        print(f"✅ Model version '{name}' ready ({'live' if promote else 'shadow'})")
+
+    def promote(self):
+        """
+        Make the current shadow candidate live
+        """
+        with self._lock:
+            candidate = self._candidate
+            self._candidate = None
+        if candidate is None:
+            raise ValueError("No candidate model loaded")
+        self._swap(candidate)
+
+    def on_swap(self, callback):
+        """
+        Call callback(version) after every promotion, e.g. to reload
+        out-of-process copies of the live weights
+        """
+        self._swap_listeners.append(callback)
+
+    def _swap(self, version):
+        with self._lock:
+            old = self._live
+            self._live = version
+            self._history.append({"name": version.name, "promoted_at": time.time()})
+        self._retire(old)
+
+        for callback in self._swap_listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                print(f"⚠️ Swap listener failed for '{version.name}': {e}")
+
+    def _retire(self, version):
+        def drain_and_free():
+            version.wait_drained()
+            version.free()
+            print(f"♻️ Model version '{version.name}' drained and freed")
+
+        threading.Thread(target=drain_and_free, daemon=True).start()
+
+    # -------- introspection --------
+    def stats(self):
+        with self._lock:
+            live, candidate = self._live, self._candidate
+        return {
+            "live": live.info(),
+            "candidate": candidate.info() if candidate else None,
+            "loading": dict(self._loading),
+            "history": list(self._history),
+            "shadow_rate": self.shadow_rate,
+            "shadow": self.shadow_stats.snapshot()
+        }
+
+
+# Base model goes live first. Only the registry holds it, so retiring
+# it after a promotion frees the weights.
+registry = ModelRegistry(
+    ModelVersion(
+        "base",
+        sentiment_model.MODEL_NAME,
+        *sentiment_model.load_model(sentiment_model.MODEL_NAME)
+    )
+)
@@ -0,0 +1,439 @@
+import argparse
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from model.dataset import LABELS, label_order, load_financial_sentiment
+
+MODEL_NAME = "ProsusAI/finbert"
+
+# Response frame: job id, row count, embedding dim (0 = none), then
+# row-major float32 probabilities followed by the float32 embeddings.
+# dim == _ERROR marks a failed job; the payload is the error text.
+_HEADER = struct.Struct("<QII")
+_ERROR = 0xFFFFFFFF
+
+# A replica that dies is respawned, backing off 0s, 1s, 2s, ...
+RESTART_ATTEMPTS = 3
+
+
+# ---------------------------------
+# Replica process
+# ---------------------------------
+def _replica_main(cores, source, conn):
+    # Pin before torch spins up its thread pool so every intra-op
+    # thread inherits the affinity
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    import torch.nn.functional as F
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    from model.sentiment_model import forward_with_embeddings
+
+    torch.set_num_threads(len(cores))
+    torch.set_num_interop_threads(1)
+
+    tokenizer = AutoTokenizer.from_pretrained(source, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(source, use_safetensors=True)
+    model.eval()
+
+    # Columns go out in LABELS order whatever the checkpoint's own order is
+    columns = [label_order(model.config).index(label) for label in LABELS]
+
+    def score(texts, return_embeddings=False):
+        inputs = tokenizer(
+            texts,
+            return_tensors="pt",
+            truncation=True,
+            padding=True,
+            max_length=128
+        )
+        with torch.inference_mode():
+            logits, embeddings = forward_with_embeddings(model, inputs, return_embeddings)
+            if return_embeddings:
+                embeddings = np.ascontiguousarray(embeddings.float().numpy())
+        probs = F.softmax(logits.float(), dim=-1).numpy()
+        return np.ascontiguousarray(probs[:, columns], dtype=np.float32), embeddings
+
+    score(["warm up"])
+    conn.send_bytes(b"ready")
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+
+        job_id, texts, return_embeddings = msg
+        try:
+            probs, embeddings = score(texts, return_embeddings)
+        except Exception as e:
+            # Fail only this job; the replica keeps serving
+            conn.send_bytes(_HEADER.pack(job_id, len(texts), _ERROR) + repr(e).encode("utf-8"))
+            continue
+        dim = embeddings.shape[1] if embeddings is not None else 0
+        frame = _HEADER.pack(job_id, len(texts), dim) + probs.tobytes()
+        if embeddings is not None:
+            frame += embeddings.tobytes()
+        conn.send_bytes(frame)
+
+    conn.close()
+
+
+def _to_results(probs):
+    results = []
+    for row in probs.tolist():
+        probabilities = {LABELS[i]: float(row[i]) for i in range(len(LABELS))}
+        label = max(probabilities, key=probabilities.get)
+        results.append({
+            "label": label,
+            "confidence": round(probabilities[label], 4),
+            "probabilities": probabilities
+        })
+    return results
+
+
+def partition_cores(n_replicas, cores=None):
+    """
+    Split the cores this process may run on into n disjoint, contiguous sets
+    """
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") \
+            else list(range(os.cpu_count() or 1))
+    if n_replicas > len(cores):
+        raise ValueError(f"{n_replicas} replicas requested but only {len(cores)} cores available")
+
+    size, extra = divmod(len(cores), n_replicas)
+    sets, start = [], 0
+    for i in range(n_replicas):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(cores[start:end])
+        start = end
+    return sets
+
+
+# ---------------------------------
+# Replica pool
+# ---------------------------------
+class _Replica:
+    def __init__(self, index, cores, process, conn):
+        self.index = index
+        self.cores = cores
+        self.process = process
+        self.conn = conn
+        self.pending = {}    # job id -> Future
+        self.load = 0        # rows queued or running
+        self.send_lock = threading.Lock()
+
+
+class ReplicaPool:
+    """
+    N model replica processes, each pinned to its own cores.
+
+    Batches go to the replica with the fewest outstanding rows. Requests
+    are pickled (job id, texts); responses come back as a fixed header
+    plus a raw float32 probability block, so no per-row objects cross
+    the process boundary. A job that raises fails only its own Future,
+    and a replica process that dies is restarted on the same cores.
+
+    Users that may submit after someone else swaps the pool out hold it
+    with acquire()/release(); close it only after wait_drained().
+    """
+
+    def __init__(self, n_replicas, source=MODEL_NAME, cores=None, batch_size=32):
+        self.source = source
+        self.batch_size = batch_size
+        self._core_sets = partition_cores(n_replicas, cores)
+        self._replicas = []
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._ctx = mp.get_context("spawn")
+        self._closed = False
+        self.restarts = 0
+        self.inflight = 0
+        self._drained = threading.Condition()
+
+    # -------- process lifecycle --------
+    def _spawn(self, index, cores):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_replica_main,
+            args=(cores, self.source, child_conn),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _Replica(index, cores, process, parent_conn)
+
+    @staticmethod
+    def _wait_ready(replica):
+        try:
+            return replica.conn.recv_bytes() == b"ready"
+        except (EOFError, OSError):
+            return False
+
+    @staticmethod
+    def _stop(replicas, timeout):
+        for replica in replicas:
+            try:
+                with replica.send_lock:
+                    replica.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for replica in replicas:
+            replica.process.join(timeout=timeout)
+            if replica.process.is_alive():
+                replica.process.terminate()
+
+    def _serve(self, replica):
+        threading.Thread(target=self._reader, args=(replica,), daemon=True).start()
+
+    def start(self):
+        replicas = [self._spawn(i, cores) for i, cores in enumerate(self._core_sets)]
+        with self._lock:
+            self._replicas = replicas
+
+        # Wait for every replica to load + warm before taking traffic
+        for replica in replicas:
+            if not self._wait_ready(replica):
+                # Don't leave the replicas that did start running
+                self.close(timeout=10)
+                raise RuntimeError(f"Replica {replica.index} failed to start")
+            self._serve(replica)
+
+        print(f"✅ {len(replicas)} replicas ready on cores {self._core_sets}")
+        return self
+
+    def _restart(self, dead):
+        dead.process.join(timeout=1)
+        for attempt in range(RESTART_ATTEMPTS):
+            time.sleep(attempt)
+            if self._closed:
+                return
+            replica = self._spawn(dead.index, dead.cores)
+            if not self._wait_ready(replica):
+                self._stop([replica], timeout=1)
+                continue
+
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._replicas[dead.index] = replica
+                    self.restarts += 1
+            if closed:
+                self._stop([replica], timeout=10)
+                return
+            self._serve(replica)
+            print(f"♻️ Replica {dead.index} restarted on cores {dead.cores}")
+            return
+
+        print(f"❌ Replica {dead.index} failed to restart after {RESTART_ATTEMPTS} attempts")
+
+    # -------- responses --------
+    def _reader(self, replica):
+        while True:
+            try:
+                frame = replica.conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+
+            job_id, n, dim = _HEADER.unpack_from(frame)
+            with self._lock:
+                future = replica.pending.pop(job_id)
+                replica.load -= n
+
+            if dim == _ERROR:
+                message = frame[_HEADER.size:].decode("utf-8", "replace")
+                future.set_exception(RuntimeError(f"Replica {replica.index} job failed: {message}"))
+                continue
+
+            probs = np.frombuffer(
+                frame, dtype=np.float32, count=n * len(LABELS), offset=_HEADER.size
+            ).reshape(n, len(LABELS))
+
+            if dim:
+                embeddings = np.frombuffer(
+                    frame, dtype=np.float32, offset=_HEADER.size + probs.nbytes
+                ).reshape(n, dim)
+                future.set_result((_to_results(probs), embeddings))
+            else:
+                future.set_result(_to_results(probs))
+
+        # Replica died: fail whatever it still owed, then bring it back
+        with self._lock:
+            pending, replica.pending = replica.pending, {}
+            replica.load = float("inf")
+            closed = self._closed
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Replica {replica.index} exited"))
+        if not closed:
+            self._restart(replica)
+
+    # -------- requests --------
+    def submit(self, texts, return_embeddings=False):
+        """
+        Send one batch to the least-loaded replica; returns a Future of
+        the results, or of (results, pooled embeddings) when asked for
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Replica pool is closed")
+            replica = min(self._replicas, key=lambda r: r.load)
+            if replica.load == float("inf"):
+                raise RuntimeError("No live replicas")
+            job_id = next(self._job_ids)
+            replica.pending[job_id] = future
+            replica.load += len(texts)
+
+        try:
+            with replica.send_lock:
+                replica.conn.send((job_id, list(texts), return_embeddings))
+        except (BrokenPipeError, OSError):
+            with self._lock:
+                if replica.pending.pop(job_id, None) is not None:
+                    replica.load -= len(texts)
+            raise RuntimeError(f"Replica {replica.index} exited")
+        return future
+
+    def predict_batch(self, texts, return_embeddings=False):
+        futures = [
+            self.submit(texts[i:i + self.batch_size], return_embeddings)
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if not return_embeddings:
+            results = []
+            for future in futures:
+                results.extend(future.result())
+            return results
+
+        results, embeddings = [], []
+        for future in futures:
+            batch_results, batch_embeddings = future.result()
+            results.extend(batch_results)
+            embeddings.append(batch_embeddings)
+        return results, np.concatenate(embeddings)
+
+    def predict(self, text):
+        return self.submit([text]).result()[0]
+
+    # -------- users / shutdown --------
+    def acquire(self):
+        with self._drained:
+            self.inflight += 1
+
+    def release(self):
+        with self._drained:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self._drained.notify_all()
+
+    def wait_drained(self):
+        with self._drained:
+            while self.inflight > 0:
+                self._drained.wait()
+
+    def stats(self):
+        with self._lock:
+            return [
+                {"replica": r.index, "cores": r.cores, "outstanding_rows": r.load,
+                 "alive": r.process.is_alive()}
+                for r in self._replicas
+            ]
+
+    def close(self, timeout=None):
+        """
+        Stop every replica. Jobs already sent are answered first; with a
+        timeout, replicas still busy after it are terminated.
+        """
+        with self._lock:
+            self._closed = True
+            replicas, self._replicas = self._replicas, []
+        self._stop(replicas, timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------
+# Offline bulk scoring + scaling benchmark
+# ---------------------------------
+def score_csv(args):
+    with open(args.input, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    texts = [row.get(args.text_column, "") for row in rows]
+
+    with ReplicaPool(args.replicas, args.source, batch_size=args.batch_size) as pool:
+        start = time.perf_counter()
+        results = pool.predict_batch(texts)
+        elapsed = time.perf_counter() - start
+
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([args.text_column, "label", "confidence"] + LABELS)
+        for text, r in zip(texts, results):
+            writer.writerow(
+                [text, r["label"], r["confidence"]] + [r["probabilities"][l] for l in LABELS]
+            )
+
+    print(f"✅ Scored {len(texts)} rows in {elapsed:.1f}s ({len(texts) / elapsed:.1f}/s) → {args.output}")
+
+
+def bench(args):
+    texts, _ = load_financial_sentiment()
+    texts = texts[:args.limit]
+    counts = [int(n) for n in args.replicas.split(",")]
+
+    print(f"Rows: {len(texts)}  batch size: {args.batch_size}")
+    print(f"{'replicas':>8} {'threads/rep':>11} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+
+    baseline = None
+    for n in counts:
+        with ReplicaPool(n, args.source, batch_size=args.batch_size) as pool:
+            pool.predict_batch(texts[:args.batch_size * n])
+            start = time.perf_counter()
+            pool.predict_batch(texts)
+            throughput = len(texts) / (time.perf_counter() - start)
+            threads = len(pool._core_sets[0])
+
+        baseline = baseline or throughput / counts[0]
+        speedup = throughput / baseline
+        print(f"{n:>8} {threads:>11} {throughput:>10.1f} {speedup:>7.2f}x {speedup / n:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process CPU inference")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("score", help="Bulk-score a CSV")
+    p.add_argument("--input", default="data/financial_sentiment.csv")
+    p.add_argument("--output", default="data/scored.csv")
+    p.add_argument("--text-column", default="Sentence")
+    p.add_argument("--replicas", type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    p.add_argument("--source", default=MODEL_NAME)
+    p.add_argument("--batch-size", type=int, default=32)
+    p.set_defaults(func=score_csv)
+
+    p = sub.add_parser("bench", help="Throughput vs replica count")
+    p.add_argument("--replicas", default="1,2,4,8")
+    p.add_argument("--limit", type=int, default=2000)
+    p.add_argument("--source", default=MODEL_NAME)
+    p.add_argument("--batch-size", type=int, default=32)
+    p.set_defaults(func=bench)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,35 +1,75 @@
+import threading
+
 import torch
 import torch.nn.functional as F
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
+from model.dataset import LABELS, label_order
+
 MODEL_NAME = "ProsusAI/finbert"
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# tokenizer (safe)
-tokenizer = AutoTokenizer.from_pretrained(
-    MODEL_NAME,
-    use_fast=True
-)
 
-# model — FORCE SAFETENSORS (this fixes the error)
-model = AutoModelForSequenceClassification.from_pretrained(
-    MODEL_NAME,
-    device_map=None,
-    dtype=torch.float16,
-    low_cpu_mem_usage=True,
-    use_safetensors=True   # 🔥 THIS IS THE KEY
-)
+def load_model(name=MODEL_NAME, dtype=torch.float16):
+    # tokenizer (safe)
+    tokenizer = AutoTokenizer.from_pretrained(
+        name,
+        use_fast=True
+    )
+
+    # model — FORCE SAFETENSORS (this fixes the error)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        name,
+        device_map=None,
+        dtype=dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True   # 🔥 THIS IS THE KEY
+    )
 
-model.to(device)
-model.eval()
+    model.to(device)
+    model.eval()
 
-LABELS = ["negative", "neutral", "positive"]
+    return tokenizer, model
 
 
-def predict_sentiment(text: str):
+# Pooled embeddings are taken from a forward hook on the base model, so
+# the classifier forward runs once and no per-layer hidden states are kept.
+# One hook per model, writing to thread-local state: concurrent requests
+# on the same model each see only their own batch.
+_pooled = threading.local()
+_hook_lock = threading.Lock()
+
+
+def _capture_pooled(module, args, output):
+    if getattr(_pooled, "wanted", False):
+        pooled = getattr(output, "pooler_output", None)
+        # BERT pooler output ([CLS] -> dense -> tanh), the vector the
+        # classifier head reads; raw [CLS] for models without a pooler
+        _pooled.value = pooled if pooled is not None else output[0][:, 0]
+
+
+def forward_with_embeddings(model, inputs, return_embeddings=False):
+    """
+    (logits, pooled embeddings or None) from a single forward pass
+    """
+    base = getattr(model, model.base_model_prefix)
+    with _hook_lock:
+        if not getattr(base, "_pooled_hook", None):
+            base._pooled_hook = base.register_forward_hook(_capture_pooled)
+
+    _pooled.wanted, _pooled.value = return_embeddings, None
+    try:
+        logits = model(**inputs).logits
+    finally:
+        _pooled.wanted = False
+    embeddings, _pooled.value = _pooled.value, None
+    return logits, embeddings
+
+
+def predict_batch_with(tokenizer, model, texts, return_embeddings=False):
     inputs = tokenizer(
-        text,
+        texts,
         return_tensors="pt",
         truncation=True,
         padding=True,
@@ -39,19 +79,46 @@ def predict_sentiment(text: str):
     inputs = {k: v.to(device) for k, v in inputs.items()}
 
     with torch.no_grad():
-        outputs = model(**inputs)
+        logits, embeddings = forward_with_embeddings(model, inputs, return_embeddings)
+        if return_embeddings:
+            embeddings = embeddings.float().cpu().numpy()
+
+    probs = F.softmax(logits.float(), dim=-1).tolist()
+
+    # Output index -> label comes from the checkpoint's own config
+    index = {label: i for i, label in enumerate(label_order(model.config))}
+
+    results = []
+    for row in probs:
+        probabilities = {
+            label: float(row[index[label]])
+            for label in LABELS
+        }
+
+        label = max(probabilities, key=probabilities.get)
 
-    probs = F.softmax(outputs.logits, dim=-1)[0]
+        results.append({
+            "label": label,
+            "confidence": round(probabilities[label], 4),
+            "probabilities": probabilities
+        })
 
-    probabilities = {
-        LABELS[i]: float(probs[i])
-        for i in range(len(LABELS))
-    }
+    if return_embeddings:
+        return results, embeddings
+    return results
+
+
+def predict_with(tokenizer, model, text: str):
+    return predict_batch_with(tokenizer, model, [text])[0]
+
+
+# The registry owns the live weights (base included), so a hot-swap really
+# frees the old ones; imported lazily because it imports this module
+def predict_sentiment(text: str):
+    from model.registry import registry
+    return registry.predict(text)
 
-    label = max(probabilities, key=probabilities.get)
 
-    return {
-        "label": label,
-        "confidence": round(probabilities[label], 4),
-        "probabilities": probabilities
-    }
+def predict_sentiment_batch(texts):
+    from model.registry import registry
+    return registry.predict_batch(texts)
@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+SCAN_CHUNK = 65536
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _text_key(meta):
+    """
+    Dedup key: the text with case and whitespace runs ignored
+    """
+    text = meta.get("text")
+    if text is None:
+        return None
+    return " ".join(str(text).split()).casefold()
+
+
+def _topk(scores, k):
+    """
+    Row-wise top-k (indices, scores) of a 2-D score matrix, best first
+    """
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class SimilarityIndex:
+    """
+    Append-only cosine index over headline embeddings.
+
+    Files in `path`:
+      index.json   dim + dtype
+      vectors.bin  row-major unit vectors (float16 or float32), memory-mapped
+      meta.jsonl   one line per row: id, text, label, confidence (the ID map)
+      ivf.npz      optional coarse clustering: centroids + per-row list ids
+
+    Search is an exact blocked matrix product by default, or probes the
+    `nprobe` nearest IVF lists once build_ivf() has been run. A text that
+    is already indexed is not added again, so repeated headlines don't
+    crowd everything else out of the top-k.
+    """
+
+    def __init__(self, path, dim=None, dtype="float16"):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        config_path = os.path.join(path, "index.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+            dim, dtype = config["dim"], config["dtype"]
+
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._meta_path = os.path.join(path, "meta.jsonl")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+
+        self._offsets = []
+        self._keys = set()
+        self._matrix = None
+        self.count = 0
+        self.centroids = None
+        self.assignments = None
+        self._lists = None
+
+        self._load()
+
+    # -------- persistence --------
+    def _write_config(self):
+        with open(os.path.join(self.path, "index.json"), "w") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+    def _load(self):
+        keys = []
+        if os.path.exists(self._meta_path):
+            offset = 0
+            with open(self._meta_path, "rb") as f:
+                for line in f:
+                    self._offsets.append(offset)
+                    offset += len(line)
+                    try:
+                        keys.append(_text_key(json.loads(line)))
+                    except ValueError:
+                        keys.append(None)    # torn last line, truncated below
+
+        if self.dim and os.path.exists(self._vectors_path):
+            rows = os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize)
+            # A crash between the two appends leaves one file longer:
+            # only rows present in both count
+            self.count = min(rows, len(self._offsets))
+            self._truncate_to_count()
+
+        self._keys = set(keys[:self.count])
+        self._keys.discard(None)
+
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            assignments = ivf["assignments"][:self.count]
+
+            # Rows appended since the last build go to their nearest list
+            if len(assignments) < self.count:
+                tail = np.asarray(self.matrix()[len(assignments):], dtype=np.float32)
+                assignments = np.concatenate(
+                    [assignments, np.argmax(tail @ ivf["centroids"].T, axis=1)]
+                )
+
+            self._set_ivf(ivf["centroids"], assignments)
+
+    def _truncate_to_count(self):
+        with open(self._vectors_path, "r+b") as f:
+            f.truncate(self.count * self.dim * self.dtype.itemsize)
+        if len(self._offsets) > self.count:
+            with open(self._meta_path, "r+b") as f:
+                f.truncate(self._offsets[self.count])
+            del self._offsets[self.count:]
+
+    def _set_ivf(self, centroids, assignments):
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = assignments.astype(np.int32)
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(centroids))]
+
+    def _snapshot(self):
+        """
+        (matrix, centroids, lists) as of now. add() grows all three under
+        the lock, so searches read them together and bound rows by the
+        matrix they actually got.
+        """
+        with self._lock:
+            lists = list(self._lists) if self._lists is not None else None
+            return self.matrix(), self.centroids, lists
+
+    def matrix(self):
+        if self.count == 0:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        if self._matrix is None or self._matrix.shape[0] != self.count:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=self.dtype, mode="r", shape=(self.count, self.dim)
+            )
+        return self._matrix
+
+    # -------- writes --------
+    def add(self, vectors, metas):
+        """
+        Append rows whose text isn't indexed yet; returns the new row ids
+        """
+        vectors = _normalize(vectors)
+        if len(vectors) != len(metas):
+            raise ValueError("vectors and metas must have the same length")
+
+        with self._lock:
+            keep, new_keys = [], set()
+            for i, meta in enumerate(metas):
+                key = _text_key(meta)
+                if key is None or (key not in self._keys and key not in new_keys):
+                    keep.append(i)
+                    new_keys.add(key)
+            if not keep:
+                return []
+            vectors = vectors[keep]
+            metas = [metas[i] for i in keep]
+
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_config()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+
+            first_id = self.count
+            with open(self._meta_path, "ab") as f:
+                offset = f.tell()
+                for i, meta in enumerate(metas):
+                    line = (json.dumps({"id": first_id + i, **meta}) + "\n").encode("utf-8")
+                    self._offsets.append(offset)
+                    f.write(line)
+                    offset += len(line)
+
+            # New rows join their nearest existing IVF list right away
+            if self.centroids is not None:
+                new = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+                self.assignments = np.concatenate([self.assignments, new])
+                for row, c in enumerate(new, start=first_id):
+                    self._lists[c] = np.append(self._lists[c], row)
+
+            self.count += len(vectors)
+            self._keys.update(new_keys - {None})
+            return list(range(first_id, self.count))
+
+    def meta(self, row):
+        with open(self._meta_path, "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())
+
+    # -------- IVF --------
+    def build_ivf(self, n_lists, iters=10, sample=100_000, seed=0):
+        """
+        Spherical k-means on a sample, then assign every row
+        """
+        matrix, _, _ = self._snapshot()
+        count = matrix.shape[0]
+        if n_lists < 1:
+            raise ValueError("n_lists must be at least 1")
+        if n_lists > count:
+            raise ValueError(f"Need at least {n_lists} vectors, have {count}")
+
+        rng = np.random.default_rng(seed)
+        sample_idx = rng.choice(count, size=min(sample, count), replace=False)
+        data = np.asarray(matrix[np.sort(sample_idx)], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=n_lists, replace=False)]
+
+        for _ in range(iters):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            # Re-seed empty lists from random points
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, SCAN_CHUNK):
+            block = np.asarray(matrix[start:start + SCAN_CHUNK], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        with self._lock:
+            # Rows added while clustering
+            if self.count > len(assignments):
+                tail = np.asarray(self.matrix()[len(assignments):], dtype=np.float32)
+                assignments = np.concatenate(
+                    [assignments, np.argmax(tail @ centroids.T, axis=1).astype(np.int32)]
+                )
+            np.savez(self._ivf_path, centroids=centroids, assignments=assignments)
+            self._set_ivf(centroids, assignments)
+
+    # -------- search --------
+    def search(self, queries, k=10, nprobe=None):
+        """
+        Top-k cosine neighbours for a batch of queries.
+        Returns one list of (row, score) per query.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        queries = _normalize(np.atleast_2d(queries))
+        matrix, centroids, lists = self._snapshot()
+        if matrix.shape[0] == 0:
+            return [[] for _ in queries]
+
+        if nprobe and centroids is not None:
+            return self._search_ivf(matrix, centroids, lists, queries, k, nprobe)
+        return self._search_exact(matrix, queries, k)
+
+    def _search_exact(self, matrix, queries, k):
+        best_idx = np.zeros((len(queries), 0), dtype=np.int64)
+        best_score = np.zeros((len(queries), 0), dtype=np.float32)
+
+        # Blocked scan keeps the score matrix bounded at millions of rows
+        for start in range(0, matrix.shape[0], SCAN_CHUNK):
+            block = np.asarray(matrix[start:start + SCAN_CHUNK], dtype=np.float32)
+            idx, score = _topk(queries @ block.T, k)
+            best_idx = np.concatenate([best_idx, idx + start], axis=1)
+            best_score = np.concatenate([best_score, score], axis=1)
+            pick, best_score = _topk(best_score, k)
+            best_idx = np.take_along_axis(best_idx, pick, axis=1)
+
+        return [list(zip(i.tolist(), s.tolist())) for i, s in zip(best_idx, best_score)]
+
+    def _search_ivf(self, matrix, centroids, lists, queries, k, nprobe):
+        probes, _ = _topk(queries @ centroids.T, min(nprobe, len(centroids)))
+
+        results = []
+        for query, probe in zip(queries, probes):
+            rows = np.concatenate([lists[c] for c in probe])
+            rows = np.sort(rows[rows < matrix.shape[0]])
+            if len(rows) == 0:
+                results.append([])
+                continue
+            scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+            idx, score = _topk(scores[None, :], k)
+            results.append(list(zip(rows[idx[0]].tolist(), score[0].tolist())))
+        return results
+
+
+class VersionedIndex:
+    """
+    One SimilarityIndex per model source under `root`.
+
+    Embeddings from different weights live in different spaces, so
+    vectors are only ever added to and searched within the index of the
+    model version that produced them.
+    """
+
+    def __init__(self, root, dtype="float16"):
+        self.root = root
+        self.dtype = dtype
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dirname(source):
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", source).strip("._") or "default"
+
+    def get(self, source):
+        with self._lock:
+            index = self._indexes.get(source)
+            if index is None:
+                index = SimilarityIndex(
+                    os.path.join(self.root, self.dirname(source)), dtype=self.dtype
+                )
+                self._indexes[source] = index
+            return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Similarity index maintenance")
+    parser.add_argument("path", help="Per-model index dir, e.g. $SIMILARITY_INDEX_DIR/ProsusAI_finbert")
+    parser.add_argument("--build-ivf", type=int, default=None, metavar="N_LISTS",
+                        help="Cluster the index into N coarse lists (~sqrt(rows) is a good start)")
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    index = SimilarityIndex(args.path)
+    print(f"Index: {index.count} vectors, dim={index.dim}, dtype={index.dtype.name}")
+
+    if args.build_ivf:
+        index.build_ivf(args.build_ivf, iters=args.iters)
+        print(f"✅ Built IVF with {args.build_ivf} lists")
@@ -0,0 +1,112 @@
+import os
+
+import torch
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from model.dataset import LABELS, label_order, load_financial_sentiment, train_test_split
+from model.early_exit import EarlyExitFinBERT, EARLY_EXIT_DIR, DEFAULT_EXIT_LAYERS
+
+# -------------------------------
+# 1️⃣ Config
+# -------------------------------
+# Heads are trained on top of the fine-tuned model when it exists
+BACKBONE = os.getenv(
+    "EARLY_EXIT_BACKBONE",
+    "finbert_trained" if os.path.isdir("finbert_trained") else "ProsusAI/finbert"
+)
+EPOCHS = 3
+BATCH_SIZE = 32
+LEARNING_RATE = 1e-3
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+print("CUDA available:", torch.cuda.is_available())
+print(f"✅ Backbone: {BACKBONE}")
+
+# -------------------------------
+# 2️⃣ Data (same held-out split as the evaluation scripts)
+# -------------------------------
+(train_texts, train_labels), (test_texts, test_labels) = train_test_split(
+    *load_financial_sentiment()
+)
+print(f"✅ Train: {len(train_texts)}  Test: {len(test_texts)}")
+
+# -------------------------------
+# 3️⃣ Model: frozen backbone + trainable exit heads
+# -------------------------------
+tokenizer = AutoTokenizer.from_pretrained(BACKBONE, use_fast=True)
+backbone = AutoModelForSequenceClassification.from_pretrained(BACKBONE, num_labels=3)
+model = EarlyExitFinBERT(backbone, DEFAULT_EXIT_LAYERS).to(device)
+
+# Heads must share the final classifier's output order, which comes
+# from the backbone config, not from the dataset's label ids
+to_backbone = [label_order(backbone.config).index(label) for label in LABELS]
+train_labels = [to_backbone[y] for y in train_labels]
+test_labels = [to_backbone[y] for y in test_labels]
+
+for p in model.backbone.parameters():
+    p.requires_grad = False
+
+optimizer = torch.optim.AdamW(model.heads.parameters(), lr=LEARNING_RATE)
+
+
+def encode(texts):
+    batch = tokenizer(
+        texts,
+        return_tensors="pt",
+        truncation=True,
+        padding=True,
+        max_length=128
+    )
+    return {k: v.to(device) for k, v in batch.items()}
+
+
+# -------------------------------
+# 4️⃣ Train heads
+# -------------------------------
+for epoch in range(EPOCHS):
+    model.train()
+    model.backbone.eval()
+    order = torch.randperm(len(train_texts)).tolist()
+    total_loss = 0.0
+
+    for i in range(0, len(order), BATCH_SIZE):
+        idx = order[i:i + BATCH_SIZE]
+        inputs = encode([train_texts[j] for j in idx])
+        labels = torch.tensor([train_labels[j] for j in idx], device=device)
+
+        with torch.no_grad():
+            hidden_states = model.backbone(**inputs, output_hidden_states=True).hidden_states
+
+        # Final classifier is frozen; only intermediate heads get a loss
+        logits = model.exit_logits(hidden_states)[:-1]
+        loss = sum(F.cross_entropy(l, labels) for l in logits) / len(logits)
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item() * len(idx)
+
+    # Per-exit accuracy on the held-out split
+    model.eval()
+    correct = [0] * (len(model.exit_layers) + 1)
+    with torch.no_grad():
+        for i in range(0, len(test_texts), BATCH_SIZE):
+            inputs = encode(test_texts[i:i + BATCH_SIZE])
+            labels = torch.tensor(test_labels[i:i + BATCH_SIZE], device=device)
+            hidden_states = model.backbone(**inputs, output_hidden_states=True).hidden_states
+
+            for k, l in enumerate(model.exit_logits(hidden_states)):
+                correct[k] += int((l.argmax(dim=-1) == labels).sum())
+
+    names = [f"L{l}" for l in model.exit_layers] + [f"L{model.num_layers}"]
+    accs = "  ".join(f"{n}={c / len(test_texts):.3f}" for n, c in zip(names, correct))
+    print(f"epoch {epoch + 1}: loss={total_loss / len(train_texts):.4f}  {accs}")
+
+# -------------------------------
+# 5️⃣ Save heads
+# -------------------------------
+model.save_heads(EARLY_EXIT_DIR, BACKBONE)
+
+print(f"🎉 EARLY-EXIT HEADS SAVED TO {EARLY_EXIT_DIR}")
+print("Run `python -m model.early_exit` for the accuracy vs speed curve")
@@ -1,4 +1,4 @@
-from datasets import load_dataset
+from datasets import Dataset, DatasetDict
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
@@ -7,6 +7,8 @@ from transformers import (
 )
 import torch
 
+from model.dataset import LABEL_MAP, load_financial_sentiment, train_test_split
+
 # -------------------------------
 # 1️⃣ Check GPU
 # -------------------------------
@@ -14,43 +16,29 @@ print("CUDA available:", torch.cuda.is_available())
 print("GPU:", torch.cuda.get_device_name(0) if torch.cuda.is_available() else "CPU")
 
 # -------------------------------
-# 2️⃣ Load CSV dataset
-# -------------------------------
-dataset = load_dataset("csv", data_files="data/financial_sentiment.csv")
-dataset = dataset["train"].train_test_split(test_size=0.2)
-
-# -------------------------------
-# 3️⃣ Detect columns
+# 2️⃣ Load CSV dataset (shared seeded split)
 # -------------------------------
-sample = dataset["train"][0]
-TEXT_COL, LABEL_COL = None, None
-
-for k in sample.keys():
-    if k.lower() in ["sentence", "text", "content", "headline", "news"]:
-        TEXT_COL = k
-    if k.lower() in ["label", "sentiment", "class"]:
-        LABEL_COL = k
+# Same 80/20 split model/evaluate.py and model/early_exit.py hold out,
+# so their "held-out" rows were never seen in training
+(train_texts, train_labels), (test_texts, test_labels) = train_test_split(
+    *load_financial_sentiment()
+)
+dataset = DatasetDict({
+    "train": Dataset.from_dict({"text": train_texts, "labels": train_labels}),
+    "test": Dataset.from_dict({"text": test_texts, "labels": test_labels})
+})
+TEXT_COL = "text"
 
-print(f"✅ Using text column: {TEXT_COL}")
-print(f"✅ Using label column: {LABEL_COL}")
+print(f"✅ Train: {len(train_texts)}  Test: {len(test_texts)}")
 
 # -------------------------------
-# 4️⃣ Label mapping (CRITICAL)
+# 3️⃣ Label mapping (CRITICAL)
 # -------------------------------
-LABEL_MAP = {
-    "negative": 0,
-    "neutral": 1,
-    "positive": 2
-}
-
-def encode_labels(batch):
-    batch["labels"] = [LABEL_MAP[str(x).lower()] for x in batch[LABEL_COL]]
-    return batch
-
-dataset = dataset.map(encode_labels, batched=True)
+# Saved into the config so id2label matches how labels were encoded
+ID2LABEL = {i: label for label, i in LABEL_MAP.items()}
 
 # -------------------------------
-# 5️⃣ Tokenization
+# 4️⃣ Tokenization
 # -------------------------------
 model_name = "ProsusAI/finbert"
 tokenizer = AutoTokenizer.from_pretrained(model_name)
@@ -71,15 +59,17 @@ dataset.set_format(
 )
 
 # -------------------------------
-# 6️⃣ Load model
+# 5️⃣ Load model
 # -------------------------------
 model = AutoModelForSequenceClassification.from_pretrained(
     model_name,
-    num_labels=3
+    num_labels=3,
+    id2label=ID2LABEL,
+    label2id=LABEL_MAP
 )
 
 # -------------------------------
-# 7️⃣ Training arguments (Transformers 4.57+)
+# 6️⃣ Training arguments (Transformers 4.57+)
 # -------------------------------
 training_args = TrainingArguments(
     output_dir="finbert_trained",
@@ -96,7 +86,7 @@ training_args = TrainingArguments(
 )
 
 # -------------------------------
-# 8️⃣ Trainer
+# 7️⃣ Trainer
 # -------------------------------
 trainer = Trainer(
     model=model,
@@ -106,12 +96,12 @@ trainer = Trainer(
 )
 
 # -------------------------------
-# 9️⃣ Train
+# 8️⃣ Train
 # -------------------------------
 trainer.train()
 
 # -------------------------------
-# 🔟 Save model
+# 9️⃣ Save model
 # -------------------------------
 trainer.save_model("finbert_trained")
 tokenizer.save_pretrained("finbert_trained")
@@ -17,7 +17,11 @@ for article in news:
     title = article.get("title", "")
     payload = {"text": title}
 
-    response = requests.post(API_URL, json=payload)
+    # Replay traffic is bulk: it yields to interactive dashboard requests
+    response = requests.post(API_URL, json=payload, headers={"X-Priority": "bulk"})
+    while response.status_code in (429, 503):
+        time.sleep(int(response.headers.get("Retry-After", "1")))
+        response = requests.post(API_URL, json=payload, headers={"X-Priority": "bulk"})
     result = response.json()
 
     with open("data/sentiment_log.csv", "a", newline="") as f:
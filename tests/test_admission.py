@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import pytest
+
+from api.admission import (
+    BULK, DEFAULT_DEADLINE_MS, INTERACTIVE, MAX_DEADLINE_MS, AdmissionController, Rejected,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def deadline_in(seconds):
+    return time.monotonic() + seconds
+
+
+def test_admits_immediately_when_a_slot_is_free():
+    async def scenario():
+        controller = AdmissionController(concurrency=2)
+        await controller.acquire(INTERACTIVE, deadline_in(5))
+        await controller.acquire(BULK, deadline_in(5))
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["busy"] == 2
+    assert stats["classes"][INTERACTIVE]["admitted"] == 1
+    assert stats["classes"][BULK]["admitted"] == 1
+
+
+def test_interactive_dispatches_before_earlier_bulk():
+    async def scenario():
+        controller = AdmissionController(concurrency=1)
+        started = await controller.acquire(INTERACTIVE, deadline_in(5))
+        order = []
+
+        async def waiter(priority):
+            await controller.acquire(priority, deadline_in(5))
+            order.append(priority)
+
+        bulk = asyncio.ensure_future(waiter(BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(waiter(INTERACTIVE))
+        await asyncio.sleep(0)
+
+        controller.release(started, INTERACTIVE)
+        await interactive
+        controller.release(time.monotonic(), INTERACTIVE)
+        await bulk
+        return order
+
+    assert run(scenario()) == [INTERACTIVE, BULK]
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue={INTERACTIVE: 1, BULK: 1})
+        await controller.acquire(INTERACTIVE, deadline_in(5))
+        queued = asyncio.ensure_future(controller.acquire(INTERACTIVE, deadline_in(5)))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Rejected) as excinfo:
+            await controller.acquire(INTERACTIVE, deadline_in(5))
+        queued.cancel()
+        return excinfo.value, controller.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert stats["classes"][INTERACTIVE]["rejected_queue_full"] == 1
+
+
+def test_predicted_deadline_miss_is_rejected_with_503():
+    async def scenario():
+        controller = AdmissionController(concurrency=1)
+        await controller.acquire(INTERACTIVE, deadline_in(5))
+        with pytest.raises(Rejected) as excinfo:
+            await controller.acquire(INTERACTIVE, deadline_in(0.05))
+        return excinfo.value, controller.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 503
+    assert stats["classes"][INTERACTIVE]["rejected_deadline"] == 1
+
+
+def test_entry_expired_at_dispatch_becomes_503():
+    async def scenario():
+        controller = AdmissionController(concurrency=1)
+        started = await controller.acquire(INTERACTIVE, deadline_in(5))
+        queued = asyncio.ensure_future(controller.acquire(INTERACTIVE, deadline_in(5)))
+        await asyncio.sleep(0)
+
+        # Deadline passes while queued; the next release finds it expired
+        controller._queues[INTERACTIVE][0][0] = 0.0
+        controller.release(started, INTERACTIVE)
+
+        with pytest.raises(Rejected) as excinfo:
+            await queued
+        return excinfo.value, controller.stats()
+
+    rejected, stats = run(scenario())
+    assert rejected.status_code == 503
+    assert stats["busy"] == 0
+    assert stats["classes"][INTERACTIVE]["expired_in_queue"] == 1
+
+
+def test_cancelled_waiter_leaves_queue_and_keeps_slots():
+    async def scenario():
+        controller = AdmissionController(concurrency=1)
+        started = await controller.acquire(INTERACTIVE, deadline_in(5))
+        queued = asyncio.ensure_future(controller.acquire(INTERACTIVE, deadline_in(5)))
+        await asyncio.sleep(0)
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        controller.release(started, INTERACTIVE)
+        return controller.stats()
+
+    stats = run(scenario())
+    assert stats["busy"] == 0
+    assert stats["classes"][INTERACTIVE]["queue_depth"] == 0
+
+
+def test_service_time_is_tracked_per_class():
+    async def scenario():
+        controller = AdmissionController(concurrency=1)
+        started = await controller.acquire(BULK, deadline_in(60))
+        controller.release(started - 10.0, BULK)
+        return controller
+
+    controller = run(scenario())
+    assert controller.service_s[BULK] > 1.0
+    assert controller.service_s[INTERACTIVE] == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize("header", ["nan", "inf", "-inf", "-500", "0", "soon"])
+def test_invalid_deadline_header_uses_class_default(header):
+    controller = AdmissionController(concurrency=1)
+    before = time.monotonic()
+    priority, deadline = controller.classify({"x-deadline-ms": header})
+    assert priority == INTERACTIVE
+    assert deadline - before == pytest.approx(DEFAULT_DEADLINE_MS[INTERACTIVE] / 1000, abs=0.5)
+
+
+def test_long_deadline_header_is_capped():
+    controller = AdmissionController(concurrency=1)
+    before = time.monotonic()
+    _, deadline = controller.classify({"x-deadline-ms": "1e300"})
+    assert deadline - before <= MAX_DEADLINE_MS / 1000 + 0.5
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.admission import INTERACTIVE, AdmissionController, Rejected
+from api.coalesce import SingleFlight
+
+
+def test_identical_burst_takes_one_admission_slot():
+    async def scenario():
+        controller = AdmissionController(concurrency=4, max_queue={INTERACTIVE: 8, "bulk": 8})
+        flight = SingleFlight()
+        release_model = threading.Event()
+        calls = []
+
+        def infer():
+            release_model.wait(5)
+            calls.append(1)
+            return {"label": "positive"}
+
+        async def admit():
+            started = await controller.acquire(INTERACTIVE, asyncio.get_running_loop().time() + 60)
+            return lambda: controller.release(started, INTERACTIVE)
+
+        async def request():
+            return await flight.do_async("headline", infer, admit=admit)
+
+        tasks = [asyncio.ensure_future(request()) for _ in range(100)]
+        await asyncio.sleep(0.05)
+        busy_during = controller.stats()["busy"]
+        release_model.set()
+        results = await asyncio.gather(*tasks)
+        return results, calls, busy_during, controller.stats(), flight.stats()
+
+    results, calls, busy_during, admission_stats, flight_stats = asyncio.run(scenario())
+    assert all(r == {"label": "positive"} for r in results)
+    assert len(calls) == 1
+    assert busy_during == 1
+    assert admission_stats["busy"] == 0
+    assert admission_stats["classes"][INTERACTIVE]["admitted"] == 1
+    assert flight_stats["coalesced"] == 99
+
+
+def test_rejected_leader_fails_its_followers_too():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def admit():
+            await asyncio.sleep(0.01)
+            raise Rejected(429, "interactive queue full", 1)
+
+        tasks = [
+            asyncio.ensure_future(flight.do_async("headline", lambda: "never", admit=admit))
+            for _ in range(3)
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True), flight.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert all(isinstance(r, Rejected) and r.status_code == 429 for r in results)
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def admit():
+            await gate.wait()
+            return None
+
+        leader = asyncio.ensure_future(flight.do_async("headline", lambda: "ok", admit=admit))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("headline", lambda: "other", admit=admit))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        gate.set()
+        return await follower
+
+    assert asyncio.run(scenario()) == "ok"
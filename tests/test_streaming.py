@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("fastapi")
+
+from api.streaming import negotiate
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, "json"),
+    ("*/*", "json"),
+    ("application/x-ndjson", "ndjson"),
+    ("application/json, application/x-ndjson;q=0.1", "json"),
+    ("application/x-ndjson;q=0", "json"),
+    ("application/x-ndjson;q=0.5, */*;q=0.9", "json"),
+    ("*/*;q=0, application/x-ndjson", "ndjson"),
+])
+def test_negotiate_follows_q_values(accept, expected):
+    assert negotiate(accept) == expected